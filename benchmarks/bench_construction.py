@@ -0,0 +1,32 @@
+"""
+ Time to build translatable model classes, as done when importing the
+ models of a project:
+
+   $ python benchmarks/bench_construction.py [models] [languages]
+
+"""
+import sys
+import time
+
+from benchutils import build_models, setup_django
+
+MODELS = 200
+LANGUAGES = 30
+
+args = [int(arg) for arg in sys.argv[1:3]]
+n_models = args and args[0] or MODELS
+n_languages = len(args) > 1 and args[1] or LANGUAGES
+
+setup_django(languages=tuple([('l%d' % i, 'Language %d' % i) for i in range(n_languages)]))
+
+
+def main():
+    start = time.time()
+    build_models(n_models)
+    elapsed = time.time() - start
+    print('%d models with %d languages: %.3f s (%.2f ms per model)' % (
+        n_models, n_languages, elapsed, elapsed * 1000 / n_models))
+
+
+if __name__ == '__main__':
+    main()
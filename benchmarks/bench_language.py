@@ -0,0 +1,66 @@
+"""
+ Cost of rendering a translatable field of some objects in every language,
+ switching the language with django's activate() (before), with
+ transmeta.language() and with get_translation(field, lang) (after).
+"""
+from benchutils import LANGUAGES, setup_django, time_per_call
+
+setup_django()
+
+from django.db import models
+from django.utils.translation import activate, deactivate
+
+import transmeta
+from transmeta import TransMeta
+
+
+class Meta:
+    app_label = 'transmeta'
+    translate = ('title', )
+
+Book = TransMeta('Book', (models.Model, ), {
+    '__module__': __name__,
+    'title': models.CharField(max_length=200),
+    'Meta': Meta,
+})
+
+LANGUAGE_CODES = [lang_code for lang_code, lang_name in LANGUAGES]
+
+
+def render_activating(books):
+    titles = []
+    for lang in LANGUAGE_CODES:
+        activate(lang)
+        titles.extend([book.title for book in books])
+    deactivate()
+    return titles
+
+
+def render_with_context(books):
+    titles = []
+    for lang in LANGUAGE_CODES:
+        with transmeta.language(lang):
+            titles.extend([book.title for book in books])
+    return titles
+
+
+def render_per_call(books):
+    titles = []
+    for lang in LANGUAGE_CODES:
+        titles.extend([book.get_translation('title', lang) for book in books])
+    return titles
+
+
+def main():
+    books = [Book(title_en='A book %d' % i, title_es='Un libro %d' % i) for i in range(100)]
+    assert render_activating(books) == render_with_context(books) == render_per_call(books)
+    before = time_per_call(lambda: render_activating(books), number=200)
+    print('%d objects in %d languages' % (len(books), len(LANGUAGE_CODES)))
+    print('activate():        %7.0f us' % (before / 1000))
+    for name, render in (('language():', render_with_context), ('get_translation():', render_per_call)):
+        after = time_per_call(lambda: render(books), number=200)
+        print('%-18s %7.0f us  (x%.1f)' % (name, after / 1000, before / after))
+
+
+if __name__ == '__main__':
+    main()
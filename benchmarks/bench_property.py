@@ -0,0 +1,64 @@
+"""
+ Per-access cost of the translated property, with the fallback chain
+ computed on every read (before) and memoized per language (after), and
+ with the fallback instrumentation enabled (counted).
+"""
+from benchutils import setup_django, time_per_call
+
+setup_django()
+
+from django.conf import settings
+from django.db import models
+from django.utils.translation import activate, get_language
+
+from transmeta import TransMeta, fallback_language, get_real_fieldname, instrumentation
+
+
+def legacy_default_value(field):
+    """ the translated property as it was before memoizing the chain """
+
+    def default_value_func(self):
+        attname = lambda x: get_real_fieldname(field, x)
+
+        if getattr(self, attname(get_language()), None):
+            result = getattr(self, attname(get_language()))
+        elif getattr(self, attname(get_language()[:2]), None):
+            result = getattr(self, attname(get_language()[:2]))
+        else:
+            default_language = fallback_language()
+            if getattr(self, attname(default_language), None):
+                result = getattr(self, attname(default_language), None)
+            else:
+                result = getattr(self, attname(settings.LANGUAGE_CODE), None)
+        return result
+
+    return default_value_func
+
+
+class Meta:
+    app_label = 'transmeta'
+    translate = ('title', )
+
+Book = TransMeta('Book', (models.Model, ), {
+    '__module__': __name__,
+    'title': models.CharField(max_length=200),
+    'Meta': Meta,
+})
+Book.legacy_title = property(legacy_default_value('title'))
+
+
+def main():
+    book = Book(title_en='A book', title_es='Un libro')
+    for language, case in (('es', 'hit'), ('fr', 'fallback')):
+        activate(language)
+        before = time_per_call(lambda: book.legacy_title)
+        after = time_per_call(lambda: book.title)
+        instrumentation.enable()
+        counted = time_per_call(lambda: book.title)
+        instrumentation.disable()
+        print('%-9s before: %7.0f ns  after: %7.0f ns  (x%.1f)  counted: %7.0f ns' % (
+            case, before, after, before / after, counted))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""
+ Model of the sync_transmeta_db benchmark of benchmarks/run.py. Its table
+ is created with a not translatable "title" and the "body" columns of two
+ languages, so the command copies "title" into a column per language and
+ adds the "body" columns of the new languages.
+"""
+from django.db import models
+
+from transmeta import TransMeta
+
+
+class Meta:
+    translate = ('title', 'body')
+
+Book = TransMeta('Book', (models.Model, ), {
+    '__module__': __name__,
+    'title': models.CharField(max_length=200, null=True),
+    'body': models.TextField(null=True),
+    'price': models.IntegerField(default=0),
+    'Meta': Meta,
+})
@@ -0,0 +1,69 @@
+"""
+ Helpers shared by the transmeta benchmarks.
+
+ The benchmarks are plain scripts; run them from the root of the project:
+
+   $ python benchmarks/bench_property.py
+
+ benchmarks/run.py runs the whole suite and writes the results as JSON.
+
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LANGUAGES = (
+    ('en', 'English'),
+    ('es', 'Spanish'),
+    ('fr', 'French'),
+    ('de', 'German'),
+    ('it', 'Italian'),
+)
+
+
+def setup_django(languages=LANGUAGES, **extra_settings):
+    """ configures a sqlite backed django with transmeta installed """
+    from django.conf import settings
+    if not settings.configured:
+        options = dict(
+            DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                                   'NAME': ':memory:'}},
+            INSTALLED_APPS=['transmeta'],
+            LANGUAGE_CODE=languages[0][0],
+            LANGUAGES=languages,
+            USE_I18N=True,
+        )
+        options.update(extra_settings)
+        settings.configure(**options)
+    import django
+    if hasattr(django, 'setup'):  # django >= 1.7
+        django.setup()
+
+
+def build_models(count, prefix='Synthetic'):
+    """ builds count models with three translatable fields each """
+    from django.db import models
+    from transmeta import TransMeta
+
+    built = []
+    for i in range(count):
+        class Meta:
+            app_label = 'transmeta'
+            translate = ('title', 'description', 'body')
+        built.append(TransMeta('%s%d' % (prefix, i), (models.Model, ), {
+            '__module__': __name__,
+            'title': models.CharField(max_length=200, verbose_name='title'),
+            'description': models.TextField(verbose_name='description'),
+            'body': models.TextField(default='', verbose_name='body'),
+            'price': models.FloatField(),
+            'Meta': Meta,
+        }))
+    return built
+
+
+def time_per_call(func, number=100000, repeat=5):
+    """ returns the best time per call of func, in nanoseconds """
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
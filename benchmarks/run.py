@@ -0,0 +1,208 @@
+"""
+ Benchmark suite of the transmeta hot paths, on SQLite. The results are
+ written as JSON, to compare them between versions:
+
+   $ python benchmarks/run.py --output=before.json
+   ... upgrade ...
+   $ python benchmarks/run.py --compare=before.json
+
+ Cases:
+
+   property.<level>: a read of a translated property, for each fallback
+                     level (ns)
+   construction: a TransMeta class with 3 translatable fields (ms)
+   get_all_translatable_fields: a lookup of the fields of a model (ns)
+   sync_transmeta_db: a run on a table with --rows rows, making a field
+                      translatable and adding languages to another (s)
+
+"""
+from __future__ import print_function
+
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from optparse import OptionParser
+
+from benchutils import build_models, setup_django, time_per_call
+
+ROWS = 100000
+CONSTRUCTION_MODELS = 100
+CONSTRUCTION_LANGUAGES = 30
+
+LANGUAGES = (
+    ('en', 'English'),
+    ('es', 'Spanish'),
+    ('fr', 'French'),
+    ('de', 'German'),
+    ('it', 'Italian'),
+)
+
+# LANGUAGE_CODE and TRANSMETA_DEFAULT_LANGUAGE differ, so every fallback
+# level of the translated property can be measured
+setup_django(languages=LANGUAGES, TRANSMETA_DEFAULT_LANGUAGE='es',
+             INSTALLED_APPS=['transmeta', 'benchapp'])
+
+import django
+from django.core.management import call_command
+from django.db import connection, models, transaction
+from django.test.utils import override_settings
+from django.utils.translation import activate, deactivate
+
+from transmeta import TransMeta, get_all_translatable_fields
+
+from benchapp.models import Book as SyncBook
+
+
+class AbstractMeta:
+    abstract = True
+    app_label = 'transmeta'
+    translate = ('title', )
+
+Publication = TransMeta('Publication', (models.Model, ), {
+    '__module__': __name__,
+    'title': models.CharField(max_length=200),
+    'Meta': AbstractMeta,
+})
+
+
+class Meta:
+    app_label = 'transmeta'
+    translate = ('description', )
+
+Book = TransMeta('Book', (Publication, ), {
+    '__module__': __name__,
+    'description': models.TextField(null=True),
+    'Meta': Meta,
+})
+
+# (level, active language, values of the object)
+PROPERTY_CASES = (
+    ('hit', 'fr', {'title_fr': 'Un livre', 'title_en': 'A book'}),
+    ('short', 'fr-ca', {'title_fr': 'Un livre', 'title_en': 'A book'}),
+    ('fallback', 'de', {'title_es': 'Un libro', 'title_en': 'A book'}),
+    ('default', 'de', {'title_en': 'A book'}),
+    ('missing', 'de', {}),
+)
+
+
+def bench_property():
+    results = []
+    for level, language, values in PROPERTY_CASES:
+        book = Book(**values)
+        activate(language)
+        results.append(('property.%s' % level, time_per_call(lambda: book.title), 'ns'))
+    deactivate()
+    return results
+
+
+def bench_construction():
+    languages = tuple([('l%d' % i, 'Language %d' % i) for i in range(CONSTRUCTION_LANGUAGES)])
+    with override_settings(LANGUAGES=languages, LANGUAGE_CODE='l0', TRANSMETA_DEFAULT_LANGUAGE='l0'):
+        start = time.time()
+        build_models(CONSTRUCTION_MODELS, prefix='Construction')
+        elapsed = time.time() - start
+    return [('construction', elapsed * 1000 / CONSTRUCTION_MODELS, 'ms')]
+
+
+def bench_translatable_fields():
+    return [
+        ('get_all_translatable_fields', time_per_call(lambda: get_all_translatable_fields(Book)), 'ns'),
+        ('get_all_translatable_fields.current_table',
+         time_per_call(lambda: get_all_translatable_fields(Book, column_in_current_table=True)), 'ns'),
+    ]
+
+
+def create_sync_table(rows):
+    """ creates the table of benchapp.Book as it was before its fields were translatable """
+    qn = connection.ops.quote_name
+    db_table = qn(SyncBook._meta.db_table)
+    cursor = connection.cursor()
+    cursor.execute('DROP TABLE IF EXISTS %s' % db_table)
+    cursor.execute('CREATE TABLE %s (id integer NOT NULL PRIMARY KEY, title varchar(200) NULL, '
+                   'body_en text NULL, body_es text NULL, price integer NOT NULL)' % db_table)
+    cursor.executemany('INSERT INTO %s (id, title, body_en, body_es, price) VALUES (%%s, %%s, %%s, %%s, %%s)' % db_table,
+                       [(i, 'Title %d' % i, 'Body %d' % i, 'Cuerpo %d' % i, i) for i in range(1, rows + 1)])
+    transaction.commit_unless_managed()
+
+
+def bench_sync(rows):
+    results = []
+    checkpoint_dir = tempfile.mkdtemp()
+    stdout = sys.stdout
+    try:
+        for name, batch_size in (('sync_transmeta_db', 0), ('sync_transmeta_db.batches', 10000)):
+            create_sync_table(rows)
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                start = time.time()
+                call_command('sync_transmeta_db', assume_yes=True, batch_size=batch_size,
+                             checkpoint=os.path.join(checkpoint_dir, 'checkpoint.json'))
+                elapsed = time.time() - start
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            if SyncBook.objects.filter(title_es__isnull=False).count() != rows:
+                raise AssertionError('sync_transmeta_db did not copy the data of the table')
+            results.append((name, elapsed, 's'))
+    finally:
+        shutil.rmtree(checkpoint_dir)
+    return results
+
+
+def run(rows):
+    results = []
+    results.extend(bench_property())
+    results.extend(bench_construction())
+    results.extend(bench_translatable_fields())
+    results.extend(bench_sync(rows))
+    cursor = connection.cursor()
+    cursor.execute('SELECT sqlite_version()')
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': cursor.fetchone()[0],
+        'rows': rows,
+        'results': [{'name': name, 'value': round(value, 3), 'unit': unit}
+                    for name, value, unit in results],
+    }
+
+
+def print_comparison(report, previous):
+    previous_values = dict([(result['name'], result['value']) for result in previous['results']])
+    for result in report['results']:
+        before = previous_values.get(result['name'])
+        ratio = before and '(x%.2f)' % (float(before) / result['value']) or ''
+        print('%-45s %12.3f %-2s  before: %12s  %s' % (result['name'], result['value'], result['unit'],
+                                                      before is not None and '%.3f' % before or '-', ratio),
+              file=sys.stderr)
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--rows', dest='rows', type='int', default=ROWS,
+                      help="Rows of the sync_transmeta_db table (default: %d)" % ROWS)
+    parser.add_option('-o', '--output', dest='output',
+                      help="File to write the results to (default: the standard output)")
+    parser.add_option('--compare', dest='compare',
+                      help="Results of a previous run, to show the changes")
+    options, args = parser.parse_args()
+
+    report = run(options.rows)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+    if options.compare:
+        with open(options.compare) as previous_file:
+            print_comparison(report, json.load(previous_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+ Runs the transmeta tests on SQLite, from the root of the project:
+
+   $ python tests/runtests.py
+
+"""
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS_DIR)
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from django.conf import settings
+
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                           'NAME': ':memory:'}},
+    INSTALLED_APPS=['transmeta', 'testapp'],
+    LANGUAGE_CODE='en',
+    LANGUAGES=(
+        ('en', 'English'),
+        ('es', 'Spanish'),
+        ('fr', 'French'),
+    ),
+    USE_I18N=True,
+)
+
+import django
+if hasattr(django, 'setup'):  # django >= 1.7
+    django.setup()
+
+from django.test.utils import get_runner
+
+
+def main():
+    test_runner = get_runner(settings)(verbosity=1, interactive=False)
+    failures = test_runner.run_tests(sys.argv[1:] or ['testapp'])
+    sys.exit(bool(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+ Models of the transmeta tests: one per kind of primary key and storage of
+ the translatable fields.
+"""
+from django.db import models
+
+from transmeta import TransMeta
+
+
+class BookMeta:
+    translate = ('title', 'body')
+
+Book = TransMeta('Book', (models.Model, ), {
+    '__module__': __name__,
+    'title': models.CharField(max_length=200),
+    'body': models.TextField(null=True, blank=True),
+    'Meta': BookMeta,
+})
+
+
+class ChildMeta:
+    translate = ('extra', )
+
+# multi-table inheritance, its primary key is the link to Book
+Child = TransMeta('Child', (Book, ), {
+    '__module__': __name__,
+    'extra': models.CharField(max_length=200, null=True, blank=True),
+    'Meta': ChildMeta,
+})
+
+
+class CodeMeta:
+    translate = ('title', )
+
+Code = TransMeta('Code', (models.Model, ), {
+    '__module__': __name__,
+    'code': models.CharField(max_length=50, primary_key=True),
+    'title': models.CharField(max_length=200, null=True, blank=True),
+    'Meta': CodeMeta,
+})
+
+
+class StockMeta:
+    translate = ('title', 'amount')
+    translate_storage = 'json'
+
+Stock = TransMeta('Stock', (models.Model, ), {
+    '__module__': __name__,
+    'title': models.CharField(max_length=200),
+    'amount': models.IntegerField(null=True, blank=True),
+    'Meta': StockMeta,
+})
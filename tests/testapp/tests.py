@@ -0,0 +1,144 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import six
+
+from transmeta.management.commands.transmeta_translations import read_po, write_po_entry
+
+from testapp.models import Book, Child, Code, Stock
+
+
+def read_po_string(value):
+    return list(read_po(io.StringIO(value)))
+
+
+class PoTestCase(TestCase):
+
+    def test_entry_round_trip(self):
+        values = [
+            u'one line',
+            u'two\nlines',
+            u'ends with a new line\n',
+            u'"quotes", \\backslashes\\ and\ttabs',
+            u'',
+        ]
+        for value in values:
+            stream = io.StringIO()
+            write_po_entry(stream, 'msgctxt', u'testapp.book:1:title')
+            write_po_entry(stream, 'msgid', value or u'source')
+            write_po_entry(stream, 'msgstr', value)
+            self.assertEqual(read_po_string(stream.getvalue()),
+                             [(u'testapp.book:1:title', value or u'source', value)])
+
+    def test_fuzzy_header(self):
+        entries = read_po_string(
+            u'#, fuzzy\n'
+            u'msgid ""\n'
+            u'msgstr ""\n'
+            u'"Language: fr\\n"\n'
+            u'\n'
+            u'msgctxt "testapp.book:1:title"\n'
+            u'msgid "One"\n'
+            u'msgstr "Un"\n'
+            u'\n'
+            u'#, fuzzy\n'
+            u'msgctxt "testapp.book:2:title"\n'
+            u'msgid "Two"\n'
+            u'msgstr "Deux"\n'
+            u'\n'
+            u'msgctxt "testapp.book:3:title"\n'
+            u'msgid "Three"\n'
+            u'msgstr "Trois"\n')
+        self.assertEqual(entries, [
+            (u'testapp.book:1:title', u'One', u'Un'),
+            (u'testapp.book:3:title', u'Three', u'Trois'),
+        ])
+
+
+class TranslationsCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.book = Book.objects.create(title_en=u'Book', body_en=u'First line\nsecond "line"')
+        self.child = Child.objects.create(title_en=u'Child', extra_en=u'Extra')
+        self.code = Code.objects.create(code=u'isbn:0-306', title_en=u'Code')
+        self.stock = Stock.objects.create(title_en=u'Stock', amount_en=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def call_command(self, *args, **options):
+        stdout = sys.stdout
+        sys.stdout = six.StringIO()
+        try:
+            call_command('transmeta_translations', *args, **options)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def translate(self, path, translations):
+        """ replaces "msgstr" values (po) or the last column (csv) of the rows with a source value """
+        with io.open(path, encoding='utf-8', newline='') as stream:
+            content = stream.read()
+        for source, translation in translations:
+            if path.endswith('.po'):
+                content = content.replace(u'msgid "%s"\nmsgstr ""' % source,
+                                          u'msgid "%s"\nmsgstr "%s"' % (source, translation))
+            else:
+                content = content.replace(u',%s,\r\n' % source, u',%s,%s\r\n' % (source, translation))
+        with io.open(path, 'w', encoding='utf-8', newline='') as stream:
+            stream.write(content)
+
+    def test_po_round_trip(self):
+        path = os.path.join(self.tmpdir, 'fr.po')
+        self.call_command('export', path, languages=['fr'])
+        self.translate(path, [(u'Book', u'Livre'), (u'Extra', u'En plus'), (u'Code', u'Le code'),
+                              (u'Stock', u'Le stock'), (u'2', u'3')])
+        output = self.call_command('import', path, languages=['fr'])
+        self.assertIn(u'Updated 5 values of 4 objects', output)
+        self.assertIn(u'(0 entries skipped)', output)
+        self.assertEqual(Book.objects.get(pk=self.book.pk).title_fr, u'Livre')
+        self.assertEqual(Child.objects.get(pk=self.child.pk).extra_fr, u'En plus')
+        self.assertEqual(Code.objects.get(pk=self.code.pk).title_fr, u'Le code')
+        stock = Stock.objects.get(pk=self.stock.pk)
+        self.assertEqual(stock.title_fr, u'Le stock')
+        self.assertEqual(stock.amount_fr, 3)
+
+    def test_po_multiline(self):
+        path = os.path.join(self.tmpdir, 'es.po')
+        self.call_command('export', path, languages=['es'])
+        with io.open(path, encoding='utf-8') as stream:
+            content = stream.read()
+        content = content.replace(u'msgid ""\n"First line\\n"\n"second \\"line\\""\nmsgstr ""',
+                                  u'msgid ""\n"First line\\n"\n"second \\"line\\""\n'
+                                  u'msgstr ""\n"Primera\\n"\n"segunda"')
+        with io.open(path, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        self.call_command('import', path, languages=['es'])
+        self.assertEqual(Book.objects.get(pk=self.book.pk).body_es, u'Primera\nsegunda')
+
+    def test_csv_round_trip(self):
+        path = os.path.join(self.tmpdir, 'translations.csv')
+        self.call_command('export', path, languages=['en', 'fr'])
+        self.translate(path, [(u'Book', u'Livre'), (u'Extra', u'En plus'), (u'Code', u'Le code'),
+                              (u'2', u'3')])
+        output = self.call_command('import', path)
+        self.assertIn(u'Updated 4 values of 4 objects', output)
+        self.assertEqual(Book.objects.get(pk=self.book.pk).title_fr, u'Livre')
+        self.assertEqual(Book.objects.get(pk=self.book.pk).body_en, u'First line\nsecond "line"')
+        self.assertEqual(Child.objects.get(pk=self.child.pk).extra_fr, u'En plus')
+        self.assertEqual(Code.objects.get(pk=self.code.pk).title_fr, u'Le code')
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).amount_fr, 3)
+
+    def test_unchanged_import(self):
+        path = os.path.join(self.tmpdir, 'translations.csv')
+        self.call_command('export', path)
+        output = self.call_command('import', path)
+        self.assertIn(u'Updated 0 values of 0 objects', output)
+        self.assertIn(u'(0 entries skipped)', output)
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).amount_en, 2)
@@ -1,16 +1,83 @@
 import copy
+import threading
 
 from django.db import models
-from django.db.models.fields import NOT_PROVIDED
+from django.db.models.fields import FieldDoesNotExist, NOT_PROVIDED
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.utils import six
 from django.utils.datastructures import SortedDict
 from django.utils.translation import get_language, ugettext_lazy as _
 
+try:
+    from contextvars import ContextVar
+except ImportError:  # python < 3.7
+    ContextVar = None
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:  # django < 1.8
+    from django.test.signals import setting_changed
+
+from transmeta.fields import TranslationsField, decode_translations, encode_translations
+
 
 LANGUAGE_CODE = 0
 LANGUAGE_NAME = 1
 
+# how the languages of a translatable field are stored (Meta's translate_storage)
+STORAGE_COLUMNS = 'columns'  # one column per language
+STORAGE_JSON = 'json'  # one JSON column with all the languages
+
+# kinds of the per language indexes of translatable fields (Meta's
+# translate_indexes), created by sync_transmeta_db
+INDEX_BTREE = 'btree'  # the column
+INDEX_LOWER = 'lower'  # LOWER() of the column, for case insensitive lookups
+INDEX_TRIGRAM = 'trigram'  # trigrams of the column, for contains lookups (PostgreSQL)
+INDEX_KINDS = (INDEX_BTREE, INDEX_LOWER, INDEX_TRIGRAM)
+
+# where the translated property found its value: the active language, its
+# short code, fallback_language(), settings.LANGUAGE_CODE or nowhere
+FALLBACK_HIT = 'hit'
+FALLBACK_SHORT = 'short'
+FALLBACK_LANGUAGE = 'fallback'
+FALLBACK_DEFAULT = 'default'
+FALLBACK_MISSING = 'missing'
+
+# settings that change the languages transmeta works with
+LANGUAGE_SETTINGS = ('LANGUAGE_CODE', 'LANGUAGES', 'TRANSMETA_LANGUAGES',
+                     'TRANSMETA_DEFAULT_LANGUAGE', 'TRANSMETA_MANDATORY_LANGUAGE')
+
+# (field, language) -> attribute names read by the translated property
+_fallback_chains = {}
+
+# language -> fallback level of each attribute of the fallback chains
+_fallback_levels = {}
+
+# callable(model, field, lang, level) called on every translated property
+# read, see transmeta.instrumentation
+_fallback_recorder = None
+
+# language of the translated properties set with transmeta.language(), it
+# takes precedence over the active django language
+if ContextVar is not None:
+    _language_override = ContextVar('transmeta_language', default=None)
+    get_language_override = _language_override.get
+else:
+    _language_override = threading.local()
+
+    def get_language_override():
+        return getattr(_language_override, 'lang', None)
+
+# per language data shared by the translatable fields of every model
+_language_specs = []
+
+# field -> "<field>_<lang>" names in every language
+_real_fieldnames = {}
+
+# model -> ModelTranslationInfo
+_translation_info = {}
+
 
 def get_languages():
     return getattr(settings, 'TRANSMETA_LANGUAGES', settings.LANGUAGES)
@@ -18,10 +85,53 @@ def get_languages():
 
 def get_real_fieldname(field, lang=None):
     if lang is None:
-        lang = get_language().split('-')[0]  # both 'en-US' and 'en' -> 'en'
+        lang = get_active_language().split('-')[0]  # both 'en-US' and 'en' -> 'en'
     return str('%s_%s' % (field, lang))
 
 
+def get_active_language():
+    """ returns the language set with transmeta.language(), or the active django language """
+    return get_language_override() or get_language()
+
+
+class language(object):
+    """
+    context manager making the translated properties (and the TransQuerySet
+    methods) use a language, without activating it in django. i.e.
+
+        with transmeta.language('fr'):
+            title = book.title
+
+    The language is local to the thread, or to the context with asyncio.
+    """
+    __slots__ = ('lang', 'token')
+
+    def __init__(self, lang):
+        self.lang = lang
+        self.token = None
+
+    if ContextVar is not None:
+        def __enter__(self):
+            self.token = _language_override.set(self.lang)
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            _language_override.reset(self.token)
+    else:
+        def __enter__(self):
+            self.token = get_language_override()  # the previous language
+            _language_override.lang = self.lang
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            _language_override.lang = self.token
+
+
+def get_translations_fieldname(field):
+    """ returns the field that stores all the languages of a field with JSON storage """
+    return str('%s_translations' % field)
+
+
 def get_field_language(real_field):
     """ return language for a field. i.e. returns "en" for "name_en" """
     return real_field.split('_')[-1]
@@ -36,8 +146,12 @@ def get_mandatory_fieldname(field, lang=None):
 
 
 def get_real_fieldname_in_each_language(field):
-    return [get_real_fieldname(field, lang[LANGUAGE_CODE])
-            for lang in get_languages()]
+    try:
+        real_fieldnames = _real_fieldnames[field]
+    except KeyError:
+        real_fieldnames = _real_fieldnames[field] = tuple([get_real_fieldname(field, lang[LANGUAGE_CODE])
+                                                           for lang in get_languages()])
+    return list(real_fieldnames)
 
 
 def canonical_fieldname(db_field):
@@ -56,10 +170,141 @@ def fallback_language():
                    settings.LANGUAGE_CODE)
 
 
+def get_fallback_codes(lang):
+    """
+    returns the (language code, fallback level) tuples the translated
+    property reads, in order, for a language
+    """
+    codes = []
+    for code, level in ((lang, FALLBACK_HIT), (lang[:2], FALLBACK_SHORT),
+                        (fallback_language(), FALLBACK_LANGUAGE)):
+        if code not in [c for c, l in codes]:
+            codes.append((code, level))
+    if codes[-1][0] != settings.LANGUAGE_CODE:
+        codes.append((settings.LANGUAGE_CODE, FALLBACK_DEFAULT))
+    return codes
+
+
+def get_fallback_chain(field, lang=None):
+    """
+    returns the attribute names read, in order, to get the value of a
+    translatable field in a language (the active one by default). i.e.
+    returns ("name_fr-ca", "name_fr", "name_en") for "name" and "fr-ca".
+    The value of the last attribute is returned even if it is empty.
+    """
+    if lang is None:
+        lang = get_active_language()
+    try:
+        return _fallback_chains[field, lang]
+    except KeyError:
+        pass
+    chain = _fallback_chains[field, lang] = tuple([get_real_fieldname(field, code)
+                                                  for code, level in get_fallback_codes(lang)])
+    return chain
+
+
+def get_fallback_levels(lang=None):
+    """
+    returns the fallback level of each attribute of the fallback chains in a
+    language (the active one by default). i.e. returns ("hit", "short",
+    "fallback") for "fr-ca"
+    """
+    if lang is None:
+        lang = get_active_language()
+    try:
+        return _fallback_levels[lang]
+    except KeyError:
+        pass
+    levels = _fallback_levels[lang] = tuple([level for code, level in get_fallback_codes(lang)])
+    return levels
+
+
+def set_fallback_recorder(recorder):
+    """
+    sets the callable(model, field, lang, level) called on every read of a
+    translated property, or None to stop recording them
+    """
+    global _fallback_recorder
+    _fallback_recorder = recorder
+
+
+def reset_language_caches(sender=None, setting=None, **kwargs):
+    """ forgets everything computed from the language settings """
+    if setting is None or setting in LANGUAGE_SETTINGS:
+        _fallback_chains.clear()
+        _fallback_levels.clear()
+        del _language_specs[:]
+        _real_fieldnames.clear()
+        _translation_info.clear()
+
+setting_changed.connect(reset_language_caches)
+
+
+def get_language_specs():
+    """
+    returns (code, lazy translated name, is mandatory, creation counter
+    offset) for every language, computed once for all the models
+    """
+    if not _language_specs:
+        languages = get_languages()
+        mandatory = mandatory_language()
+        _language_specs.extend([(lang[LANGUAGE_CODE], _(lang[LANGUAGE_NAME]),
+                                 lang[LANGUAGE_CODE] == mandatory,
+                                 float(index) / len(languages))
+                                for index, lang in enumerate(languages)])
+    return _language_specs
+
+
+def has_json_storage(model, field):
+    """ whether a translatable field of a model stores its languages in a JSON column """
+    return field in get_translation_info(model).json_fields
+
+
+def get_translations(instance, field):
+    """
+    returns the {language: value} dict of a translatable field with JSON
+    storage, typed by the field of each language. It is decoded once while
+    the field is not assigned again
+    """
+    translations_attname = get_translations_fieldname(field)
+    raw = getattr(instance, translations_attname)
+    cache = instance.__dict__.setdefault('_transmeta_translations', {})
+    cached = cache.get(translations_attname)
+    if cached is not None and cached[0] is raw:
+        return cached[1]
+    translations = instance._meta.get_field(translations_attname).to_python_translations(
+        decode_translations(raw))
+    cache[translations_attname] = (raw, translations)
+    return translations
+
+
+def translation_property(field, lang):
+    """ <field>_<lang> attribute of a translatable field with JSON storage """
+    translations_attname = get_translations_fieldname(field)
+
+    def getter(self):
+        return get_translations(self, field).get(lang)
+
+    def setter(self, value):
+        translations = dict(get_translations(self, field))
+        if value is None:
+            translations.pop(lang, None)
+        else:
+            translations[lang] = value
+        raw = encode_translations(translations)
+        setattr(self, translations_attname, raw)
+        self.__dict__['_transmeta_translations'][translations_attname] = (raw, translations)
+
+    return property(getter, setter)
+
+
 def get_all_translatable_fields(model, model_trans_fields=None, column_in_current_table=False):
     """ returns all translatable fields in a model (including superclasses ones) """
     if model_trans_fields is None:
-        model_trans_fields = set()
+        info = get_translation_info(model)
+        if column_in_current_table:
+            return info.local_fields
+        return info.fields
     model_trans_fields.update(set(getattr(model._meta, 'translatable_fields', [])))
     for parent in model.__bases__:
         if getattr(parent, '_meta', None) and (not column_in_current_table or parent._meta.abstract):
@@ -67,6 +312,60 @@ def get_all_translatable_fields(model, model_trans_fields=None, column_in_curren
     return tuple(model_trans_fields)
 
 
+class ModelTranslationInfo(object):
+    """
+    translatable fields of a model, computed once when the model class is
+    created (or when they are first needed):
+
+      fields: translatable field names, including superclasses ones
+      local_fields: the ones with columns in the table of the model
+      json_fields: the ones with JSON storage
+      real_fieldnames: field -> "<field>_<lang>" names of its languages
+      field_objects: field -> model fields storing it (one per language,
+                     or the JSON one)
+      indexes: local field -> kind of its per language indexes
+    """
+
+    def __init__(self, model):
+        opts = model._meta
+        self.fields = get_all_translatable_fields(model, set())
+        self.local_fields = get_all_translatable_fields(model, set(), column_in_current_table=True)
+        self.json_fields = set()
+        self.real_fieldnames = {}
+        self.field_objects = {}
+        for field in self.fields:
+            try:
+                self.field_objects[field] = (opts.get_field(get_translations_fieldname(field)), )
+            except FieldDoesNotExist:
+                field_objects = []
+                for real_fieldname in get_real_fieldname_in_each_language(field):
+                    try:
+                        field_objects.append(opts.get_field(real_fieldname))
+                    except FieldDoesNotExist:
+                        continue
+                self.field_objects[field] = tuple(field_objects)
+                self.real_fieldnames[field] = tuple([f.name for f in field_objects])
+            else:
+                self.json_fields.add(field)
+                self.real_fieldnames[field] = tuple([
+                    real_fieldname for real_fieldname in get_real_fieldname_in_each_language(field)
+                    if isinstance(getattr(model, real_fieldname, None), property)])
+        self.indexes = {}
+        for base in reversed(model.__mro__):
+            for field, kind in getattr(getattr(base, '_meta', None), 'translate_indexes', {}).items():
+                if field in self.local_fields and field not in self.json_fields:
+                    self.indexes[field] = kind
+
+
+def get_translation_info(model):
+    """ returns the ModelTranslationInfo of a model """
+    try:
+        return _translation_info[model]
+    except KeyError:
+        info = _translation_info[model] = ModelTranslationInfo(model)
+        return info
+
+
 def default_value(field):
     '''
     When accessing to the name of the field itself, the value
@@ -75,23 +374,51 @@ def default_value(field):
     '''
 
     def default_value_func(self):
-        attname = lambda x: get_real_fieldname(field, x)
-
-        if getattr(self, attname(get_language()), None):
-            result = getattr(self, attname(get_language()))
-        elif getattr(self, attname(get_language()[:2]), None):
-            result = getattr(self, attname(get_language()[:2]))
-        else:
-            default_language = fallback_language()
-            if getattr(self, attname(default_language), None):
-                result = getattr(self, attname(default_language), None)
-            else:
-                result = getattr(self, attname(settings.LANGUAGE_CODE), None)
-        return result
+        return get_translation(self, field)
 
     return default_value_func
 
 
+def get_translation(instance, field, lang=None):
+    """
+    returns the value of a translatable field of an instance in a language
+    (the active one by default), with the fallbacks of the translated
+    property. It is also the get_translation(field, lang) method of the
+    translatable models
+    """
+    if lang is None:
+        lang = get_language_override() or get_language()
+    try:
+        chain = _fallback_chains[field, lang]
+    except KeyError:
+        chain = get_fallback_chain(field, lang)
+    if _fallback_recorder is not None:
+        return get_recorded_value(instance, field, lang, chain)
+    result = None
+    for attname in chain:
+        result = getattr(instance, attname, None)
+        if result:
+            break
+    return result
+
+
+def get_recorded_value(instance, field, lang, chain):
+    """ returns the value of a translated property, recording its fallback level """
+    result = None
+    level = FALLBACK_MISSING
+    for attname, attname_level in zip(chain, get_fallback_levels(lang)):
+        result = getattr(instance, attname, None)
+        if result:
+            level = attname_level
+            break
+    recorder = _fallback_recorder
+    if recorder is not None:
+        # deferred loading uses subclasses of the model
+        model = getattr(instance._meta, 'concrete_model', None) or instance.__class__
+        recorder(model, field, lang, level)
+    return result
+
+
 class TransMeta(models.base.ModelBase):
     '''
     Metaclass that allow a django field, to store a value for
@@ -110,10 +437,32 @@ class TransMeta(models.base.ModelBase):
     <field_name>_<language_code>. If just <field_name> is
     accessed, we'll get the value of the current language,
     or if null, the value in the default language.
+
+    With translate_storage = 'json' in Meta, all the languages
+    of a field are stored in a <field_name>_translations JSON
+    column, so adding a language needs no schema change.
+
+    translate_indexes in Meta, i.e. {'my_i18n_field': 'lower'}, declares
+    the per language indexes that sync_transmeta_db creates.
     '''
 
     def __new__(cls, name, bases, attrs):
         attrs = SortedDict(attrs)
+        storage = STORAGE_COLUMNS
+        if 'Meta' in attrs and hasattr(attrs['Meta'], 'translate_storage'):
+            storage = attrs['Meta'].translate_storage
+            delattr(attrs['Meta'], 'translate_storage')
+        indexes = {}
+        if 'Meta' in attrs and hasattr(attrs['Meta'], 'translate_indexes'):
+            indexes = attrs['Meta'].translate_indexes
+            delattr(attrs['Meta'], 'translate_indexes')
+            if isinstance(indexes, (tuple, list)):
+                indexes = dict([(field, INDEX_BTREE) for field in indexes])
+            if not isinstance(indexes, dict) or \
+               [kind for kind in indexes.values() if kind not in INDEX_KINDS]:
+                raise ImproperlyConfigured("Meta's translate_indexes attribute must be a tuple of "
+                                           "fields or a dict of fields and index kinds (%s)" %
+                                           ', '.join(INDEX_KINDS))
         if 'Meta' in attrs and hasattr(attrs['Meta'], 'translate'):
             fields = attrs['Meta'].translate
             delattr(attrs['Meta'], 'translate')
@@ -127,10 +476,21 @@ class TransMeta(models.base.ModelBase):
                 if hasattr(base._meta, 'translatable_fields'):
                     translatable_fields.extend(list(base._meta.translatable_fields))
             new_class._meta.translatable_fields = tuple(translatable_fields)
+            new_class._meta.translate_indexes = indexes
+            _translation_info[new_class] = ModelTranslationInfo(new_class)
             return new_class
 
         if not isinstance(fields, tuple):
             raise ImproperlyConfigured("Meta's translate attribute must be a tuple")
+        if storage not in (STORAGE_COLUMNS, STORAGE_JSON):
+            raise ImproperlyConfigured("Meta's translate_storage attribute must be "
+                                       "'%s' or '%s'" % (STORAGE_COLUMNS, STORAGE_JSON))
+
+        if storage == STORAGE_JSON and indexes:
+            raise ImproperlyConfigured("Meta's translate_indexes attribute is not supported "
+                                       "with translate_storage = '%s'" % STORAGE_JSON)
+
+        language_specs = get_language_specs()
 
         for field in fields:
             if not field in attrs or \
@@ -140,35 +500,75 @@ class TransMeta(models.base.ModelBase):
                         "as specified in Meta's translate attribute" % \
                         dict(field=field, name=name))
             original_attr = attrs[field]
-            for lang in get_languages():
-                lang_code = lang[LANGUAGE_CODE]
-                lang_name = lang[LANGUAGE_NAME]
+            if storage == STORAGE_JSON:
+                translations_attr = TranslationsField(verbose_name=original_attr.verbose_name)
+                translations_attr.original_fieldname = field
+                translations_attr.creation_counter = original_attr.creation_counter
+                attrs[get_translations_fieldname(field)] = translations_attr
+            has_verbose_name = hasattr(original_attr, 'verbose_name')
+            for lang_code, lang_name, mandatory, counter_offset in language_specs:
                 lang_attr = copy.copy(original_attr)
                 lang_attr.original_fieldname = field
-                lang_attr_name = get_real_fieldname(field, lang_code)
-                if lang_code != mandatory_language():
+                # fields are compared by creation_counter (i.e. by defer()),
+                # keep every copy distinct but in the place of the original
+                lang_attr.creation_counter += counter_offset
+                if field in indexes:
+                    # sync_transmeta_db manages the indexes of the field
+                    lang_attr.db_index = False
+                if not mandatory:
                     # only will be required for mandatory language
                     if not lang_attr.null and lang_attr.default is NOT_PROVIDED:
                         lang_attr.null = True
                     if not lang_attr.blank:
                         lang_attr.blank = True
-                if hasattr(lang_attr, 'verbose_name'):
-                    lang_attr.verbose_name = LazyString(lang_attr.verbose_name, _(lang_name))
-                attrs[lang_attr_name] = lang_attr
+                if has_verbose_name:
+                    lang_attr.verbose_name = LazyString(lang_attr.verbose_name, lang_name)
+                if storage == STORAGE_JSON:
+                    # not a model field, it types and validates the values of the language
+                    lang_attr.set_attributes_from_name(get_real_fieldname(field, lang_code))
+                    translations_attr.translated_fields[lang_code] = lang_attr
+                    attrs[get_real_fieldname(field, lang_code)] = translation_property(field, lang_code)
+                else:
+                    attrs[get_real_fieldname(field, lang_code)] = lang_attr
             del attrs[field]
             attrs[field] = property(default_value(field))
 
+        if 'get_translation' not in attrs and \
+           not [base for base in bases if hasattr(base, 'get_translation')]:
+            attrs['get_translation'] = get_translation
+
         new_class = super(TransMeta, cls).__new__(cls, name, bases, attrs)
         if hasattr(new_class, '_meta'):
             new_class._meta.translatable_fields = fields
+            new_class._meta.translate_indexes = indexes
+            _translation_info[new_class] = ModelTranslationInfo(new_class)
         return new_class
 
 
 class LazyString(object):
+    """
+    verbose name of a field in a language, i.e. "description (English)".
+    It is rendered once for each active language
+    """
+    __slots__ = ('proxy', 'lang', '_rendered')
 
     def __init__(self, proxy, lang):
         self.proxy = proxy
         self.lang = lang
+        self._rendered = None  # active language -> rendered verbose name
 
     def __unicode__(self):
-        return u'%s (%s)' % (self.proxy, self.lang)
+        language = get_language()
+        try:
+            return self._rendered[language]
+        except (KeyError, TypeError):  # TypeError: nothing rendered yet
+            if self._rendered is None:
+                self._rendered = {}
+            rendered = self._rendered[language] = u'%s (%s)' % (self.proxy, self.lang)
+            return rendered
+
+    if six.PY3:
+        __str__ = __unicode__
+    else:
+        def __str__(self):
+            return self.__unicode__().encode('utf-8')
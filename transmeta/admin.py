@@ -0,0 +1,67 @@
+from django.contrib.admin.util import flatten_fieldsets
+
+from transmeta import mandatory_language
+from transmeta.forms import (add_translations_formfields, filter_fieldsets, get_form_languages,
+                             get_hidden_fieldnames)
+
+
+class TransAdminMixin(object):
+    """
+    ModelAdmin and InlineModelAdmin mixin building the form fields of some
+    languages only: the ones in the "languages" parameter of the URL (i.e.
+    ?languages=es,fr), the ones in form_languages or, by default, the
+    active language and the mandatory one. The mandatory language is always
+    shown when adding objects. The fields of other languages are left
+    unchanged when saving. The languages of the fields with JSON storage
+    get form fields too.
+    """
+    form_languages = None
+    languages_param = 'languages'
+
+    def get_form_languages(self, request, obj=None):
+        languages = self.form_languages
+        if request.GET.get(self.languages_param):
+            languages = request.GET[self.languages_param].split(',')
+        languages = get_form_languages(languages)
+        if obj is None and mandatory_language() not in languages:
+            languages.append(mandatory_language())
+        return languages
+
+    def get_hidden_fieldnames(self, request, obj=None):
+        return get_hidden_fieldnames(self.model, self.get_form_languages(request, obj))
+
+    def get_translation_exclude(self, request, obj=None):
+        """ returns the fields excluded by the admin, plus the ones of the hidden languages """
+        exclude = list(self.exclude or [])
+        exclude.extend(self.get_readonly_fields(request, obj))
+        if self.exclude is None and hasattr(self.form, '_meta') and self.form._meta.exclude:
+            exclude.extend(self.form._meta.exclude)
+        exclude.extend(self.get_hidden_fieldnames(request, obj))
+        return exclude
+
+    def get_fieldsets(self, request, obj=None):
+        fieldsets = super(TransAdminMixin, self).get_fieldsets(request, obj)
+        return filter_fieldsets(fieldsets, set(self.get_hidden_fieldnames(request, obj)))
+
+    def get_translations_form(self, request, obj=None, fields=None, exclude=None):
+        """ returns the form of the admin with the form fields of the languages of the JSON storage fields """
+        return add_translations_formfields(self.form, self.model, self.get_form_languages(request, obj),
+                                           fields, exclude)
+
+    def get_form(self, request, obj=None, **kwargs):
+        if 'exclude' not in kwargs:
+            kwargs['exclude'] = self.get_translation_exclude(request, obj)
+        if 'form' not in kwargs:
+            if 'fields' not in kwargs:
+                kwargs['fields'] = flatten_fieldsets(self.get_fieldsets(request, obj))
+            kwargs['form'] = self.get_translations_form(request, obj, kwargs['fields'], kwargs['exclude'])
+        return super(TransAdminMixin, self).get_form(request, obj, **kwargs)
+
+    def get_formset(self, request, obj=None, **kwargs):
+        if 'exclude' not in kwargs:
+            kwargs['exclude'] = self.get_translation_exclude(request, obj)
+        if 'form' not in kwargs:
+            if 'fields' not in kwargs:
+                kwargs['fields'] = flatten_fieldsets(self.get_fieldsets(request, obj))
+            kwargs['form'] = self.get_translations_form(request, obj, kwargs['fields'], kwargs['exclude'])
+        return super(TransAdminMixin, self).get_formset(request, obj, **kwargs)
@@ -0,0 +1,101 @@
+"""
+ Translation coverage of the translatable fields, computed in the database
+ with one aggregate query per table:
+
+   >>> get_translation_coverage(Book)
+   {'model': 'fooapp.book', 'table': 'fooapp_book', 'rows': 1200, 'sample': None,
+    'fields': {'title': {'en': {'filled': 1200, 'fallback': 0, 'missing': 0, 'fill_rate': 1.0},
+                         'es': {'filled': 960, 'fallback': 180, 'missing': 60, 'fill_rate': 0.8}}}}
+
+ "filled" rows have a value in the language, "fallback" rows show the value
+ of another language (see get_fallback_chain) and "missing" rows have no
+ value in any of them.
+
+"""
+from django.db import connections, models, router
+
+from transmeta import (get_fallback_chain, get_translation_info,
+                       get_translations_fieldname)
+from transmeta.managers import TransQuerySet
+
+
+def get_sample_sql(vendor, table, sample):
+    """ returns the FROM and WHERE clauses reading about sample percent of the rows of a table """
+    if not sample:
+        return table, ''
+    if vendor == 'postgresql':
+        return '%s TABLESAMPLE SYSTEM (%s)' % (table, float(sample)), ''
+    elif vendor == 'oracle':
+        return '%s SAMPLE (%s)' % (table, float(sample)), ''
+    elif vendor == 'mysql':
+        return table, ' WHERE RAND() < %s' % (float(sample) / 100)
+    elif vendor == 'sqlite':
+        # RANDOM() returns a signed 64 bits integer
+        return table, ' WHERE ABS(RANDOM() %% 1000000) < %d' % (float(sample) * 10000)
+    raise ValueError('Sampling is not supported with %s, run the report without a sample' % vendor)
+
+
+def get_translation_coverage(model, using=None, sample=None):
+    """
+    returns the filled, fallback and missing rows of each translatable field
+    of a model in each language. With sample (a percentage) only about that
+    part of the rows is read; it raises ValueError if the backend can not
+    sample.
+    """
+    using = using or router.db_for_read(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    info = get_translation_info(model)
+    table, where = get_sample_sql(connection.vendor, qn(opts.db_table), sample)
+
+    def get_column_sql(field, attname):
+        if field in info.json_fields:
+            column = '%s.%s' % (qn(opts.db_table), qn(opts.get_field(get_translations_fieldname(field)).column))
+            return TransQuerySet(model, using=using).get_json_value_sql(column, attname[len(field) + 1:]), True
+        f = opts.get_field(attname)
+        return '%s.%s' % (qn(opts.db_table), qn(f.column)), isinstance(f, (models.CharField, models.TextField))
+
+    def get_empty_sql(field, attname):
+        column, is_text = get_column_sql(field, attname)
+        if is_text:
+            return "(%s IS NULL OR %s = '')" % (column, column)
+        return '%s IS NULL' % column
+
+    aggregates = ['COUNT(*)']
+    keys = []
+    for field in sorted(info.local_fields):
+        for attname in info.real_fieldnames[field]:
+            lang = attname[len(field) + 1:]
+            fallbacks = [get_empty_sql(field, fallback) for fallback in get_fallback_chain(field, lang)
+                         if fallback != attname and fallback in info.real_fieldnames[field]]
+            empty = get_empty_sql(field, attname)
+            aggregates.append('SUM(CASE WHEN %s THEN 0 ELSE 1 END)' % empty)
+            if fallbacks:
+                aggregates.append('SUM(CASE WHEN %s AND NOT (%s) THEN 1 ELSE 0 END)' %
+                                  (empty, ' AND '.join(fallbacks)))
+            else:
+                aggregates.append('0')
+            keys.append((field, lang))
+
+    cursor = connection.cursor()
+    cursor.execute('SELECT %s FROM %s%s' % (', '.join(aggregates), table, where))
+    row = [int(value or 0) for value in cursor.fetchone()]
+
+    rows = row[0]
+    fields = {}
+    for i, (field, lang) in enumerate(keys):
+        filled, fallback = row[1 + 2 * i], row[2 + 2 * i]
+        fields.setdefault(field, {})[lang] = {
+            'filled': filled,
+            'fallback': fallback,
+            'missing': rows - filled - fallback,
+            'fill_rate': float(filled) / rows if rows else None,
+        }
+    return {
+        'model': '%s.%s' % (opts.app_label, opts.module_name),
+        'table': opts.db_table,
+        'rows': rows,
+        'sample': sample,
+        'fields': fields,
+    }
@@ -0,0 +1,84 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import six
+from django.utils.datastructures import SortedDict
+
+
+def decode_translations(value):
+    """ returns the {language: value} dict of a TranslationsField column value """
+    if not value:
+        return {}
+    elif isinstance(value, dict):  # the psycopg2 driver decodes jsonb columns
+        return value
+    return json.loads(value)
+
+
+def encode_translations(translations):
+    """ returns the JSON of a {language: value} dict, with dates and decimals as strings """
+    return json.dumps(translations, cls=DjangoJSONEncoder)
+
+
+class TranslationsField(models.TextField):
+    """
+    Stores the values of a translatable field in every language as a JSON
+    object, i.e. {"en": "my description", "es": "mi descripcion"}. It uses
+    a jsonb column with PostgreSQL and a text column with other backends.
+
+    translated_fields has a copy of the original field for each language,
+    which types, validates and gives a default and a form field to the value
+    of the language.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', '{}')
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', False)
+        super(TranslationsField, self).__init__(*args, **kwargs)
+        self.translated_fields = SortedDict()  # language -> field
+
+    def get_default(self):
+        defaults = dict([(lang, field.get_default()) for lang, field in self.translated_fields.items()
+                         if field.has_default()])
+        if defaults:
+            return encode_translations(defaults)
+        return super(TranslationsField, self).get_default()
+
+    def to_python_translations(self, translations):
+        """ returns a {language: value} dict with the values converted by the field of each language """
+        converted = {}
+        for lang, value in translations.items():
+            field = self.translated_fields.get(lang)
+            if value is not None and field is not None:
+                value = field.to_python(value)
+            converted[lang] = value
+        return converted
+
+    def validate(self, value, model_instance):
+        super(TranslationsField, self).validate(value, model_instance)
+        translations = decode_translations(value)
+        errors = []
+        for lang, field in self.translated_fields.items():
+            try:
+                field.clean(translations.get(lang), model_instance)
+            except ValidationError as e:
+                errors.extend([u'%s: %s' % (field.verbose_name, message) for message in e.messages])
+        if errors:
+            raise ValidationError(errors)
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'jsonb'
+        return super(TranslationsField, self).db_type(connection)
+
+    def get_prep_value(self, value):
+        if value is not None and not isinstance(value, six.string_types):
+            value = encode_translations(value)
+        return super(TranslationsField, self).get_prep_value(value)
+
+    def to_python(self, value):
+        if isinstance(value, dict):
+            return encode_translations(value)
+        return super(TranslationsField, self).to_python(value)
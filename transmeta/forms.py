@@ -0,0 +1,132 @@
+"""
+ Forms of translatable models with the fields of some languages only:
+
+   BookForm = translatable_modelform_factory(Book, languages=['es', 'fr'])
+
+ By default the languages are the active one and the mandatory one. The
+ fields of the other languages are not built, and their values are left
+ unchanged when the form is saved. The languages of the fields with JSON
+ storage are not model fields, their form fields are added to the form.
+"""
+from django.forms.models import ModelForm, modelform_factory
+from django.utils.datastructures import SortedDict
+
+from transmeta import (LANGUAGE_CODE, get_active_language, get_languages,
+                       get_real_fieldname, get_translation_info, mandatory_language)
+
+
+def get_form_languages(languages=None):
+    """
+    returns the available languages of a list, or the active language and
+    the mandatory one if it is None
+    """
+    available_languages = [lang[LANGUAGE_CODE] for lang in get_languages()]
+    if languages is None:
+        active_language = get_active_language() or mandatory_language()
+        if active_language not in available_languages:
+            active_language = active_language[:2]
+        languages = [active_language, mandatory_language()]
+    form_languages = []
+    for lang in languages:
+        if lang in available_languages and lang not in form_languages:
+            form_languages.append(lang)
+    return form_languages
+
+
+def get_hidden_fieldnames(model, languages):
+    """ returns the "<field>_<lang>" fields of a model in the languages not in languages """
+    info = get_translation_info(model)
+    hidden = []
+    for field in info.fields:
+        hidden.extend([real_fieldname for real_fieldname in info.real_fieldnames[field]
+                       if real_fieldname[len(field) + 1:] not in languages])
+    return hidden
+
+
+def filter_fieldsets(fieldsets, hidden):
+    """ returns admin fieldsets without the hidden fields, and without the fieldsets left empty """
+    filtered = []
+    for name, options in fieldsets:
+        fields = []
+        for field in options.get('fields', ()):
+            if isinstance(field, (list, tuple)):
+                field = tuple([f for f in field if f not in hidden])
+                if field:
+                    fields.append(field)
+            elif field not in hidden:
+                fields.append(field)
+        if fields:
+            options = dict(options)
+            options['fields'] = fields
+            filtered.append((name, options))
+    return filtered
+
+
+def get_translations_formfields(model, languages, fields=None, exclude=None):
+    """
+    returns the "<field>_<lang>" form fields of the fields of a model with
+    JSON storage in languages, in the order of the model fields. fields and
+    exclude filter them as in modelform_factory
+    """
+    info = get_translation_info(model)
+    formfields = SortedDict()
+    for translations_field in model._meta.fields:
+        field = getattr(translations_field, 'original_fieldname', None)
+        if field not in info.json_fields:
+            continue
+        for lang, lang_field in translations_field.translated_fields.items():
+            name = get_real_fieldname(field, lang)
+            if lang not in languages or not lang_field.editable or \
+               (fields is not None and name not in fields) or (exclude and name in exclude):
+                continue
+            formfield = lang_field.formfield()
+            if formfield:
+                formfields[name] = formfield
+    return formfields
+
+
+class TranslationsFormMixin(object):
+    """
+    ModelForm mixin showing and saving the form fields of the languages of
+    the fields with JSON storage, listed in translations_fieldnames
+    """
+    translations_fieldnames = ()
+
+    def __init__(self, *args, **kwargs):
+        super(TranslationsFormMixin, self).__init__(*args, **kwargs)
+        for name in self.translations_fieldnames:
+            if name not in self.initial:
+                self.initial[name] = getattr(self.instance, name)
+
+    def _post_clean(self):
+        # the model validation of the instance needs the values
+        for name in self.translations_fieldnames:
+            if name in self.cleaned_data:
+                setattr(self.instance, name, self.cleaned_data[name])
+        super(TranslationsFormMixin, self)._post_clean()
+
+
+def add_translations_formfields(form, model, languages, fields=None, exclude=None):
+    """
+    returns a subclass of a ModelForm class with the form fields of
+    get_translations_formfields, or the class if there are none
+    """
+    formfields = get_translations_formfields(model, languages, fields, exclude)
+    if not formfields:
+        return form
+    attrs = dict(formfields)
+    attrs['__module__'] = form.__module__
+    attrs['translations_fieldnames'] = tuple(formfields)
+    return type(form)(form.__name__, (TranslationsFormMixin, form), attrs)
+
+
+def translatable_modelform_factory(model, form=ModelForm, languages=None, **kwargs):
+    """
+    returns a ModelForm class, like modelform_factory, with the translated
+    fields of some languages (see get_form_languages) only
+    """
+    languages = get_form_languages(languages)
+    exclude = list(kwargs.pop('exclude', None) or [])
+    exclude.extend(get_hidden_fieldnames(model, languages))
+    form = add_translations_formfields(form, model, languages, kwargs.get('fields'), exclude)
+    return modelform_factory(model, form=form, exclude=exclude, **kwargs)
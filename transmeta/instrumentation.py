@@ -0,0 +1,74 @@
+"""
+ Opt-in counters of where the translated properties find their values, to
+ know which translations are missing in live traffic:
+
+   from transmeta import instrumentation
+
+   counter = instrumentation.enable()
+   ...
+   counter.snapshot()
+   {('fooapp.book', 'title', 'fr', 'hit'): 1520,
+    ('fooapp.book', 'title', 'fr', 'fallback'): 310}
+
+ Each read is counted with its fallback level: "hit" (the active language),
+ "short" (its short code, i.e. "fr" for "fr-ca"), "fallback"
+ (fallback_language()), "default" (settings.LANGUAGE_CODE) or "missing" (no
+ value in any of them). Any callable(model, field, lang, level) can be
+ enabled instead of a counter, i.e. to send the reads to a metrics system.
+ While disabled, the translated properties only check one global variable.
+
+"""
+import threading
+
+from transmeta import (FALLBACK_HIT, FALLBACK_SHORT, FALLBACK_LANGUAGE,
+                       FALLBACK_DEFAULT, FALLBACK_MISSING, set_fallback_recorder)
+
+LEVELS = (FALLBACK_HIT, FALLBACK_SHORT, FALLBACK_LANGUAGE, FALLBACK_DEFAULT, FALLBACK_MISSING)
+
+
+class FallbackCounter(object):
+    """ thread safe counters of translated property reads per model, field, language and level """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def __call__(self, model, field, lang, level):
+        key = (model, field, lang, level)
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self, reset=False):
+        """
+        returns a copy of the counters, a dict with (model label, field,
+        lang, level) keys
+        """
+        with self.lock:
+            counts = list(self.counts.items())
+            if reset:
+                self.counts.clear()
+        snapshot = {}
+        for (model, field, lang, level), count in counts:
+            key = ('%s.%s' % (model._meta.app_label, model._meta.module_name), field, lang, level)
+            snapshot[key] = snapshot.get(key, 0) + count
+        return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+
+def enable(recorder=None):
+    """
+    starts recording the translated property reads with a callable(model,
+    field, lang, level), a new FallbackCounter by default, and returns it
+    """
+    if recorder is None:
+        recorder = FallbackCounter()
+    set_fallback_recorder(recorder)
+    return recorder
+
+
+def disable():
+    """ stops recording the translated property reads """
+    set_fallback_recorder(None)
@@ -6,29 +6,175 @@
    1. When you add new languages to settings.LANGUAGES.
    2. When you new translatable fields to your models.
 
+ Data copies of big tables can be run in primary key ranges, resuming an
+ interrupted run where it stopped:
+
+   $ ./manage.py sync_transmeta_db --batch-size=10000 --sleep=0.5
+
+ To review the cost of the SQL before executing it:
+
+   $ ./manage.py sync_transmeta_db --plan --format=json
+
 """
+import json
+import os
 import re
+import sys
+import threading
+import time
 
+from multiprocessing.pool import ThreadPool
 from optparse import make_option
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
 from django.core.management.color import no_style
-from django.db import connection, transaction
-from django.db import backend
+from django.db import connections, models, router, transaction, DEFAULT_DB_ALIAS
 from django.db.models import get_models
 from django.db.models.fields import FieldDoesNotExist
 
+try:
+    from django.db.backends.util import truncate_name
+except ImportError:  # django >= 1.7
+    from django.db.backends.utils import truncate_name
+
 from transmeta import (mandatory_language, get_real_fieldname,
-                       get_languages, get_all_translatable_fields)
+                       get_languages, get_translation_info,
+                       get_translations_fieldname, INDEX_KINDS,
+                       INDEX_BTREE, INDEX_LOWER, INDEX_TRIGRAM)
 
 VALUE_DEFAULT = 'WITHOUT VALUE'
 
+# stages of the operations of a table: schema changes done before copying
+# data, data copies and schema changes that need the data copied
+STAGE_ALTER = 0
+STAGE_UPDATE = 1
+STAGE_ALTER_AFTER_UPDATE = 2
+STAGE_INDEX = 3
+
+CHECKPOINT_FILE = '.sync_transmeta_db.json'
+
+# cost of a statement, from the cheapest to the most expensive
+KIND_METADATA = 'metadata'  # only the catalog is changed
+KIND_SCAN = 'scan'  # the table is read, but not written
+KIND_REWRITE = 'rewrite'  # the whole table is copied
+KIND_BACKFILL = 'backfill'  # every row is updated
+KINDS = (KIND_METADATA, KIND_SCAN, KIND_REWRITE, KIND_BACKFILL)
+
+ROWS_PER_SECOND = 20000
+
+
+class AlterTable(object):
+    """ an ALTER TABLE with one or more changes """
+
+    def __init__(self, db_table, changes):
+        self.db_table = db_table
+        self.changes = changes
+
+    def get_kind(self, vendor):
+        return max([get_change_kind(change, vendor) for change in self.changes], key=KINDS.index)
+
+    def __str__(self):
+        return 'ALTER TABLE %s %s' % (self.db_table, ', '.join(self.changes))
+
+
+def get_change_kind(change, vendor):
+    """ returns how expensive is a change of an ALTER TABLE in a backend """
+    if vendor == 'postgresql':
+        # columns are added without default, so no change rewrites the table
+        if change.endswith('SET NOT NULL'):
+            return KIND_SCAN
+        return KIND_METADATA
+    elif vendor == 'sqlite' and change.startswith('ADD COLUMN'):
+        return KIND_METADATA
+    return KIND_REWRITE
+
+
+class Backfill(object):
+    """ an UPDATE of a whole table, that can be run in primary key ranges """
+
+    def __init__(self, db_table, assignment, where=None, pk_column=None):
+        self.db_table = db_table
+        self.assignment = assignment
+        self.where = where
+        self.pk_column = pk_column  # None if the primary key is not an integer
+
+    def get_kind(self, vendor):
+        return KIND_BACKFILL
+
+    def sql(self, start=None, end=None):
+        conditions = []
+        if self.where:
+            conditions.append('(%s)' % self.where)
+        if start is not None:
+            conditions.append('%s >= %d AND %s < %d' % (self.pk_column, start,
+                                                        self.pk_column, end))
+        sql = 'UPDATE %s SET %s' % (self.db_table, self.assignment)
+        if conditions:
+            sql += ' WHERE %s' % ' AND '.join(conditions)
+        return sql
+
+    def __str__(self):
+        return self.sql()
 
-def ask_for_confirmation(sql_sentences, model_full_name, assume_yes):
+
+class IndexChange(object):
+    """ a CREATE INDEX or DROP INDEX. Concurrent ones are run outside transactions """
+
+    def __init__(self, sql, create=True, concurrent=False):
+        self.sql = sql
+        self.create = create
+        self.concurrent = concurrent
+
+    def get_kind(self, vendor):
+        if self.create:
+            return KIND_SCAN
+        return KIND_METADATA
+
+    def __str__(self):
+        return self.sql
+
+
+class Checkpoint(object):
+    """ last primary key updated by each backfill, stored in a JSON file """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.positions = {}
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                self.positions = json.load(checkpoint_file)
+
+    def get(self, key, default=None):
+        return self.positions.get(key, default)
+
+    def set(self, key, position):
+        with self.lock:
+            self.positions[key] = position
+            self.save()
+
+    def remove(self, key):
+        with self.lock:
+            if self.positions.pop(key, None) is not None:
+                self.save()
+
+    def save(self):
+        if self.positions:
+            with open(self.path, 'w') as checkpoint_file:
+                json.dump(self.positions, checkpoint_file)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def print_sql(sql_sentences, model_full_name):
     print ('\nSQL to synchronize "%s" schema:' % model_full_name)
     for sentence in sql_sentences:
         print ('   %s' % sentence)
+
+
+def confirm(assume_yes):
     if assume_yes:
         print ('\nAre you sure that you want to execute the previous SQL: (y/n) [n]: YES')
         return True
@@ -50,6 +196,70 @@ def print_db_change_langs(db_change_langs, field_name, model_name):
         (field_name, model_name, ", ".join(db_change_langs)))
 
 
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = 'TB'
+    return '%.1f %s' % (size, unit)
+
+
+def allow_sync(db, model):
+    """ whether the database routers allow to sync the model into db """
+    allow = getattr(router, 'allow_migrate', None) or router.allow_syncdb  # django < 1.7
+    return allow(db, model)
+
+
+class TableSync(object):
+    """ the SQL needed to sync the table of a model in a database """
+
+    def __init__(self, db, model, model_full_name):
+        self.db = db
+        self.model = model
+        self.model_full_name = model_full_name
+        self.db_change_langs = []  # (field name, languages)
+        self.sql_sentences = []
+        self.rows = None  # estimated, None if unknown
+        self.size = None  # in bytes, None if unknown
+
+    def print_plan(self):
+        for field_name, db_change_langs in self.db_change_langs:
+            print_db_change_langs(db_change_langs, field_name, self.model_full_name)
+        print_sql(self.sql_sentences, self.model_full_name)
+
+    def get_cost(self, rows_per_second=ROWS_PER_SECOND):
+        """ returns the table statistics and the kind and estimated time of each statement """
+        vendor = connections[self.db].vendor
+        statements = []
+        for sentence in self.sql_sentences:
+            kind = sentence.get_kind(vendor)
+            seconds = None
+            if kind == KIND_BACKFILL and self.rows is not None:
+                seconds = round(float(self.rows) / rows_per_second, 1)
+            statements.append({'sql': str(sentence), 'kind': kind,
+                               'estimated_seconds': seconds})
+        return {'model': self.model_full_name, 'database': self.db,
+                'table': self.model._meta.db_table, 'rows': self.rows,
+                'size': self.size, 'statements': statements}
+
+    def print_cost(self, rows_per_second=ROWS_PER_SECOND):
+        cost = self.get_cost(rows_per_second)
+        stats = []
+        if cost['rows'] is not None:
+            stats.append('~%d rows' % cost['rows'])
+        if cost['size'] is not None:
+            stats.append(format_size(cost['size']))
+        print ('\n"%s" (table %s%s):' % (self.model_full_name, cost['table'],
+                                         stats and ', %s' % ', '.join(stats) or ''))
+        for statement in cost['statements']:
+            kind = statement['kind']
+            if statement['estimated_seconds'] is not None:
+                kind = '%s, ~%ss' % (kind, statement['estimated_seconds'])
+            print ('   [%s] %s' % (kind, statement['sql']))
+
+
 class Command(BaseCommand):
     help = "Detect new translatable fields or new available languages and sync database structure"
 
@@ -58,54 +268,76 @@ class Command(BaseCommand):
                     help="Assume YES on all queries"),
         make_option('-d', '--default', dest='default_language',
                     help="Language code of your default language"),
+        make_option('--database', action='append', dest='databases',
+                    help="Database to synchronize, it can be repeated (default: default)"),
+        make_option('-j', '--jobs', dest='jobs', type='int', default=1,
+                    help="Number of tables to synchronize at the same time"),
+        make_option('--batch-size', dest='batch_size', type='int', default=0,
+                    help="Copy data in batches of this number of primary keys"),
+        make_option('--sleep', dest='sleep', type='float', default=0,
+                    help="Seconds to wait between batches"),
+        make_option('--checkpoint', dest='checkpoint', default=CHECKPOINT_FILE,
+                    help="File to store the progress of batched data copies, "
+                         "to resume them (default: %s)" % CHECKPOINT_FILE),
+        make_option('--plan', action='store_true', dest='plan',
+                    help="Show the SQL with its estimated cost, without executing it"),
+        make_option('--format', dest='format', default='text', choices=('text', 'json'),
+                    help="Format of the plan: text or json (default: text)"),
+        make_option('--rows-per-second', dest='rows_per_second', type='int',
+                    default=ROWS_PER_SECOND,
+                    help="Rows updated per second by data copies, to estimate "
+                         "their time in the plan (default: %d)" % ROWS_PER_SECOND),
         )
 
     def handle(self, *args, **options):
         """ command execution """
         assume_yes = options.get('assume_yes', False)
         default_language = options.get('default_language', None)
-
-        # set manual transaction management
-        transaction.commit_unless_managed()
-        transaction.enter_transaction_management()
-        transaction.managed(True)
-
-        self.cursor = connection.cursor()
-        self.introspection = connection.introspection
+        databases = options.get('databases') or [DEFAULT_DB_ALIAS]
+        jobs = max(options.get('jobs') or 1, 1)
+        self.batch_size = options.get('batch_size') or 0
+        self.sleep = options.get('sleep') or 0
+        self.checkpoint = Checkpoint(options.get('checkpoint') or CHECKPOINT_FILE)
+        self.output_lock = threading.Lock()
+        # one confirmation for everything when tables are synchronized at the same time
+        self.parallel = jobs > 1 or len(databases) > 1
 
         self.default_lang = default_language or mandatory_language()
 
-        all_models = get_models()
-        found_db_change_fields = False
-        for model in all_models:
-            if hasattr(model._meta, 'translatable_fields'):
-                model_full_name = '%s.%s' % (model._meta.app_label, model._meta.module_name)
-                translatable_fields = get_all_translatable_fields(model, column_in_current_table=True)
-                db_table = model._meta.db_table
-                for field_name in translatable_fields:
-                    db_table_fields = self.get_table_fields(db_table)
-                    db_change_langs = list(set(list(self.get_db_change_languages(field_name, db_table_fields)) + [self.default_lang]))
-                    if db_change_langs:
-                        sql_sentences = self.get_sync_sql(field_name, db_change_langs, model, db_table_fields)
-                        if sql_sentences:
-                            found_db_change_fields = True
-                            print_db_change_langs(db_change_langs, field_name, model_full_name)
-                            execute_sql = ask_for_confirmation(sql_sentences, model_full_name, assume_yes)
-                            if execute_sql:
-                                print ('Executing SQL...')
-                                for sentence in sql_sentences:
-                                    self.cursor.execute(sentence)
-                                    # commit
-                                    transaction.commit()
-                                print ('Done')
-                            else:
-                                print ('SQL not executed')
-
-        if transaction.is_dirty():
-            transaction.commit()
-        transaction.leave_transaction_management()
-
-        if not found_db_change_fields:
+        table_syncs = []
+        for db in databases:
+            table_syncs.extend(self.get_table_syncs(db, multiple_databases=len(databases) > 1))
+
+        if options.get('plan'):
+            rows_per_second = options.get('rows_per_second') or ROWS_PER_SECOND
+            for table_sync in table_syncs:
+                table_sync.rows, table_sync.size = self.get_table_stats(table_sync.db,
+                                                                        table_sync.model._meta.db_table)
+            if options.get('format') == 'json':
+                print (json.dumps([table_sync.get_cost(rows_per_second) for table_sync in table_syncs],
+                                  indent=2))
+                return
+            for table_sync in table_syncs:
+                table_sync.print_cost(rows_per_second)
+        elif not self.parallel:
+            for table_sync in table_syncs:
+                table_sync.print_plan()
+                if confirm(assume_yes):
+                    print ('Executing SQL...')
+                    self.execute_table_sync(table_sync)
+                    print ('Done')
+                else:
+                    print ('SQL not executed')
+        elif table_syncs:
+            for table_sync in table_syncs:
+                table_sync.print_plan()
+            if confirm(assume_yes):
+                print ('Executing SQL in %d tables with %d jobs...' % (len(table_syncs), jobs))
+                self.execute_in_parallel(table_syncs, jobs)
+            else:
+                print ('SQL not executed')
+
+        if not table_syncs:
             print ('\nNo new translatable fields detected')
         if default_language:
             variable = 'TRANSMETA_DEFAULT_LANGUAGE'
@@ -116,13 +348,184 @@ class Command(BaseCommand):
                 print (('\n\nYou should change in your settings '
                        'the %s variable to "%s"' % (variable, default_language)))
 
+    def get_table_syncs(self, db, multiple_databases=False):
+        """ returns the TableSync of every table that needs changes in a database """
+        self.connection = connections[db]
+        self.cursor = self.connection.cursor()
+        self.introspection = self.connection.introspection
+        self.table_descriptions = {}
+        self.table_indexes = {}
+
+        table_syncs = []
+        for model in get_models():
+            if hasattr(model._meta, 'translatable_fields') and allow_sync(db, model):
+                model_full_name = '%s.%s' % (model._meta.app_label, model._meta.module_name)
+                if multiple_databases:
+                    model_full_name = '%s@%s' % (model_full_name, db)
+                table_sync = TableSync(db, model, model_full_name)
+                info = get_translation_info(model)
+                db_table = model._meta.db_table
+                db_table_fields = self.get_table_fields(db_table)
+                operations = []
+                for field_name in info.local_fields:
+                    if field_name in info.json_fields:
+                        try:
+                            operations.extend(self.get_json_sync_operations(field_name, model, db_table_fields))
+                        except ImproperlyConfigured as e:
+                            raise CommandError('%s: %s' % (model_full_name, e))
+                        continue
+                    db_change_langs = list(set(list(self.get_db_change_languages(field_name, db_table_fields)) + [self.default_lang]))
+                    if db_change_langs:
+                        field_operations = self.get_sync_operations(field_name, db_change_langs, model, db_table_fields)
+                        if field_operations:
+                            table_sync.db_change_langs.append((field_name, db_change_langs))
+                            operations.extend(field_operations)
+                    operations.extend(self.get_index_operations(field_name, model, db_table_fields))
+                table_sync.sql_sentences = self.get_table_sql(db_table, operations)
+                if table_sync.sql_sentences:
+                    table_syncs.append(table_sync)
+        return table_syncs
+
+    def execute_table_sync(self, table_sync):
+        """ executes the SQL of a table, committing each sentence """
+        db = table_sync.db
+        # set manual transaction management
+        transaction.commit_unless_managed(using=db)
+        transaction.enter_transaction_management(using=db)
+        transaction.managed(True, using=db)
+        try:
+            cursor = connections[db].cursor()
+            for sentence in table_sync.sql_sentences:
+                if isinstance(sentence, Backfill) and self.batch_size:
+                    self.run_backfill(sentence, cursor, table_sync)
+                elif isinstance(sentence, IndexChange) and sentence.concurrent:
+                    self.execute_in_autocommit(db, cursor, sentence)
+                else:
+                    cursor.execute(str(sentence))
+                # commit
+                transaction.commit(using=db)
+        finally:
+            if transaction.is_dirty(using=db):
+                transaction.rollback(using=db)
+            transaction.leave_transaction_management(using=db)
+
+    def execute_in_parallel(self, table_syncs, jobs):
+        """ executes the SQL of the tables in a pool of threads, each one with its own connections """
+        def execute(table_sync):
+            try:
+                self.execute_table_sync(table_sync)
+                error = None
+            except Exception as e:
+                error = e
+            finally:
+                connections[table_sync.db].close()
+            with self.output_lock:
+                if error is None:
+                    print ('%s: Done' % table_sync.model_full_name)
+                else:
+                    print ('%s: Error, SQL not executed completely: %s' % (table_sync.model_full_name, error))
+            return error
+
+        pool = ThreadPool(jobs)
+        try:
+            errors = [error for error in pool.imap_unordered(execute, table_syncs) if error is not None]
+        finally:
+            pool.close()
+            pool.join()
+        if errors:
+            raise CommandError('%d of %d tables could not be synchronized' % (len(errors), len(table_syncs)))
+
+    def execute_in_autocommit(self, db, cursor, sentence):
+        """ executes SQL that can not run inside a transaction block, i.e. CREATE INDEX CONCURRENTLY """
+        transaction.commit(using=db)
+        # the psycopg2 connection, out of the django transaction management
+        connection = connections[db].connection
+        autocommit = connection.autocommit
+        connection.autocommit = True
+        try:
+            cursor.execute(str(sentence))
+        finally:
+            connection.autocommit = autocommit
+
+    def report_progress(self, table_sync, message, last=False):
+        if self.parallel:
+            with self.output_lock:
+                print ('%s: %s' % (table_sync.model_full_name, message))
+        else:
+            sys.stdout.write('\r   %s' % message)
+            if last:
+                sys.stdout.write('\n')
+            sys.stdout.flush()
+
+    def run_backfill(self, backfill, cursor, table_sync):
+        """ runs a backfill in primary key ranges, committing each one """
+        if backfill.pk_column is None:
+            cursor.execute(backfill.sql())
+            return
+        cursor.execute('SELECT MIN(%s), MAX(%s) FROM %s' % (backfill.pk_column,
+                                                           backfill.pk_column,
+                                                           backfill.db_table))
+        first, last = cursor.fetchone()
+        if first is None:
+            return
+        key = '%s:%s' % (table_sync.db, backfill.sql())
+        start = self.checkpoint.get(key, first)
+        if start != first:
+            self.report_progress(table_sync, 'Resuming from %s >= %d' % (backfill.pk_column, start), last=True)
+        while start <= last:
+            end = start + self.batch_size
+            cursor.execute(backfill.sql(start, end))
+            transaction.commit(using=table_sync.db)
+            self.checkpoint.set(key, end)
+            done = min(end, last + 1) - first
+            self.report_progress(table_sync, '%d%% (%s < %d)' % (done * 100 // (last + 1 - first),
+                                                                backfill.pk_column, min(end, last + 1)),
+                                 last=end > last)
+            start = end
+            if self.sleep and start <= last:
+                time.sleep(self.sleep)
+        self.checkpoint.remove(key)
+
+    def get_table_stats(self, db, db_table):
+        """
+        returns the estimated rows and size in bytes of a table, from the
+        statistics of the backend catalog. None if they are not available
+        """
+        connection = connections[db]
+        cursor = connection.cursor()
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples, pg_total_relation_size(oid) FROM pg_class "
+                           "WHERE relname = %s AND relkind = 'r' AND pg_table_is_visible(oid)",
+                           [db_table])
+        elif connection.vendor == 'mysql':
+            cursor.execute("SELECT table_rows, data_length + index_length FROM information_schema.tables "
+                           "WHERE table_schema = DATABASE() AND table_name = %s", [db_table])
+        elif connection.vendor == 'sqlite':
+            # sqlite has no statistics of the size of the tables
+            cursor.execute("SELECT COUNT(*), NULL FROM %s" % connection.ops.quote_name(db_table))
+        else:
+            return None, None
+        row = cursor.fetchone()
+        if row is None:
+            return None, None
+        rows, size = [value is not None and int(value) or value for value in row]
+        if rows is not None and rows < 0:  # never analyzed
+            rows = None
+        return rows, size
+
+    def get_table_description(self, db_table):
+        """ get table description from schema, introspecting each table only once """
+        if db_table not in self.table_descriptions:
+            self.table_descriptions[db_table] = self.introspection.get_table_description(self.cursor, db_table)
+        return self.table_descriptions[db_table]
+
     def get_table_fields(self, db_table):
         """ get table fields from schema """
-        db_table_desc = self.introspection.get_table_description(self.cursor, db_table)
+        db_table_desc = self.get_table_description(db_table)
         return [t[0] for t in db_table_desc]
 
     def get_field_required_in_db(self, db_table, field_name, value_not_implemented=False):
-        table_fields = self.introspection.get_table_description(self.cursor, db_table)
+        table_fields = self.get_table_description(db_table)
         for f in table_fields:
             if f[0] == field_name:
                 is_null = f[-1]
@@ -153,9 +556,7 @@ class Command(BaseCommand):
             return True
 
     def get_default_field(self, field_name, model):
-        for lang_code, lang_name in get_languages():
-            field_name_i18n = get_real_fieldname(field_name, lang_code)
-            f = model._meta.get_field(field_name_i18n)
+        for f in get_translation_info(model).field_objects[field_name]:
             if not f.null:
                 return f
         try:
@@ -171,17 +572,196 @@ class Command(BaseCommand):
         if not field:
             field = model._meta.get_field(get_real_fieldname(field_name))
         try:
-            col_type = field.db_type(connection)
+            col_type = field.db_type(self.connection)
         except TypeError:  # old django
             col_type = field.db_type()
         return col_type
 
+    def can_combine_alter(self):
+        """ whether the backend accepts several changes in one ALTER TABLE """
+        return self.connection.vendor in ('postgresql', 'mysql')
+
+    def get_table_sql(self, db_table, operations):
+        """
+        returns the AlterTable and Backfill statements needed to apply the
+        operations of a table. With backends that allow it, the ALTER TABLE
+        changes of each stage are combined in a single statement, so the
+        table is rewritten only once per stage
+        """
+        qn = self.connection.ops.quote_name
+        sql_output = []
+        for stage in (STAGE_ALTER, STAGE_UPDATE, STAGE_ALTER_AFTER_UPDATE, STAGE_INDEX):
+            stage_sql = [sql for op_stage, sql in operations if op_stage == stage]
+            if not stage_sql:
+                continue
+            if stage in (STAGE_UPDATE, STAGE_INDEX):
+                sql_output.extend(stage_sql)
+            elif self.can_combine_alter():
+                sql_output.append(AlterTable(qn(db_table), stage_sql))
+            else:
+                sql_output.extend([AlterTable(qn(db_table), [sql]) for sql in stage_sql])
+        return sql_output
+
     def get_sync_sql(self, field_name, db_change_langs, model, db_table_fields):
         """ returns SQL needed for sync schema for a new translatable field """
-        qn = connection.ops.quote_name
+        operations = self.get_sync_operations(field_name, db_change_langs, model, db_table_fields)
+        return [str(sentence) for sentence in self.get_table_sql(model._meta.db_table, operations)]
+
+    def get_pk_column(self, model):
+        """ returns the quoted primary key column to run backfills in ranges, None if it is not an integer """
+        pk = model._meta.pk
+        if isinstance(pk, (models.AutoField, models.IntegerField)):
+            return self.connection.ops.quote_name(pk.column)
+        return None
+
+    def get_table_indexes(self, db_table):
+        """
+        returns a dict with the names of the indexes of a table and whether
+        they are valid, introspecting each table only once
+        """
+        if db_table in self.table_indexes:
+            return self.table_indexes[db_table]
+        vendor = self.connection.vendor
+        if vendor == 'postgresql':
+            # a failed CREATE INDEX CONCURRENTLY leaves an invalid index
+            self.cursor.execute("SELECT i.relname, x.indisvalid FROM pg_index x "
+                                "JOIN pg_class t ON t.oid = x.indrelid JOIN pg_class i ON i.oid = x.indexrelid "
+                                "WHERE t.relname = %s AND t.relkind = 'r' AND pg_table_is_visible(t.oid)",
+                                [db_table])
+        elif vendor == 'mysql':
+            self.cursor.execute("SELECT DISTINCT index_name, 1 FROM information_schema.statistics "
+                                "WHERE table_schema = DATABASE() AND table_name = %s", [db_table])
+        elif vendor == 'sqlite':
+            self.cursor.execute("SELECT name, 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s",
+                                [db_table])
+        elif vendor == 'oracle':
+            self.cursor.execute("SELECT LOWER(index_name), 1 FROM user_indexes WHERE table_name = UPPER(%s)",
+                                [db_table])
+        else:
+            self.table_indexes[db_table] = {}
+            return self.table_indexes[db_table]
+        indexes = self.table_indexes[db_table] = dict([(name, bool(valid))
+                                                       for name, valid in self.cursor.fetchall()])
+        return indexes
+
+    def get_index_name(self, db_table, column, kind):
+        return truncate_name('%s_%s_%s' % (db_table, column, kind), self.connection.ops.max_name_length())
+
+    def get_create_index_sql(self, db_table, column, kind):
+        """ returns the IndexChange creating an index of a column, None if the backend does not support its kind """
+        qn = self.connection.ops.quote_name
+        vendor = self.connection.vendor
+        concurrent = vendor == 'postgresql'
+        if kind == INDEX_BTREE:
+            expression = '(%s)' % qn(column)
+        elif kind == INDEX_LOWER:
+            expression = '(LOWER(%s))' % qn(column)
+            if vendor == 'mysql':
+                # functional key parts need their own parentheses
+                expression = '(%s)' % expression
+        elif kind == INDEX_TRIGRAM and vendor == 'postgresql':
+            # it needs the pg_trgm extension
+            expression = 'USING gin (%s gin_trgm_ops)' % qn(column)
+        else:
+            return None
+        return IndexChange('CREATE INDEX %s%s ON %s %s' % (concurrent and 'CONCURRENTLY ' or '',
+                                                          qn(self.get_index_name(db_table, column, kind)),
+                                                          qn(db_table), expression),
+                           concurrent=concurrent)
+
+    def get_drop_index_sql(self, db_table, column, kind):
+        qn = self.connection.ops.quote_name
+        name = qn(self.get_index_name(db_table, column, kind))
+        if self.connection.vendor == 'postgresql':
+            return IndexChange('DROP INDEX CONCURRENTLY %s' % name, create=False, concurrent=True)
+        elif self.connection.vendor == 'mysql':
+            return IndexChange('DROP INDEX %s ON %s' % (name, qn(db_table)), create=False)
+        return IndexChange('DROP INDEX %s' % name, create=False)
+
+    def get_index_operations(self, field_name, model, db_table_fields):
+        """
+        returns the (stage, IndexChange) operations that create the indexes
+        of a translatable field declared in Meta's translate_indexes, in
+        each language, and drop the ones of removed languages or kinds
+        """
+        info = get_translation_info(model)
+        db_table = model._meta.db_table
+        kind = info.indexes.get(field_name)
+        columns = [f.column for f in info.field_objects[field_name]]
+        pattern = re.compile('^%s_(?P<lang>\w{2})$' % field_name)
+        old_columns = [column for column in db_table_fields
+                       if pattern.match(column) and column not in columns]
+        wanted = set()
+        if kind is not None:
+            wanted = set([(column, kind) for column in columns
+                          if self.get_create_index_sql(db_table, column, kind) is not None])
+        indexes = self.get_table_indexes(db_table)
+        existing = set([(column, index_kind) for column in columns + old_columns
+                        for index_kind in INDEX_KINDS
+                        if self.get_index_name(db_table, column, index_kind) in indexes])
+        # invalid indexes are rebuilt
+        invalid = set([(column, index_kind) for column, index_kind in existing & wanted
+                       if not indexes[self.get_index_name(db_table, column, index_kind)]])
+        operations = [(STAGE_INDEX, self.get_drop_index_sql(db_table, column, index_kind))
+                      for column, index_kind in sorted((existing - wanted) | invalid)]
+        operations.extend([(STAGE_INDEX, self.get_create_index_sql(db_table, column, index_kind))
+                           for column, index_kind in sorted((wanted - existing) | invalid)])
+        return operations
+
+    def get_json_object_sql(self, items):
+        """ returns SQL building a JSON object from (key, column) items """
+        qn = self.connection.ops.quote_name
+        args = ', '.join(["'%s', %s" % (key, qn(column)) for key, column in items])
+        vendor = self.connection.vendor
+        if vendor == 'postgresql':
+            return 'json_build_object(%s)::jsonb' % args
+        elif vendor == 'mysql':
+            return 'JSON_OBJECT(%s)' % args
+        elif vendor == 'sqlite':
+            return 'json_object(%s)' % args
+        raise ImproperlyConfigured('Translations with JSON storage are not supported with %s' % vendor)
+
+    def get_json_sync_operations(self, field_name, model, db_table_fields):
+        """
+        returns the (stage, SQL) operations needed for sync schema for a
+        translatable field with JSON storage: its column is created and the
+        data of the old columns (the field before it was translatable, or one
+        column per language) is moved into it
+        """
+        qn = self.connection.ops.quote_name
+        style = no_style()
+        db_table = model._meta.db_table
+        translations_field = model._meta.get_field(get_translations_fieldname(field_name))
+        if translations_field.column in db_table_fields:
+            return []
+        col_type = translations_field.db_type(self.connection)
+        sql_output = [(STAGE_ALTER, "ADD COLUMN %s %s" % (style.SQL_FIELD(qn(translations_field.column)),
+                                                          style.SQL_COLTYPE(col_type)))]
+        if field_name in db_table_fields:
+            old_columns = [(self.default_lang, field_name)]
+        else:
+            pattern = re.compile('^%s_(?P<lang>\w{2})$' % field_name)
+            old_columns = [(pattern.match(column).group('lang'), column)
+                           for column in db_table_fields if pattern.match(column)]
+        if old_columns:
+            sql_output.append((STAGE_UPDATE, Backfill(qn(db_table), "%s = %s" % \
+                                (qn(translations_field.column), self.get_json_object_sql(old_columns)),
+                                pk_column=self.get_pk_column(model))))
+            for lang, column in old_columns:
+                sql_output.append((STAGE_ALTER_AFTER_UPDATE, "DROP COLUMN %s" % qn(column)))
+        return sql_output
+
+    def get_sync_operations(self, field_name, db_change_langs, model, db_table_fields):
+        """
+        returns the (stage, SQL) operations needed for sync schema for a new
+        translatable field. SQL of ALTER stages is the change to apply with
+        ALTER TABLE, i.e. "ADD COLUMN ...", data copies are Backfill instances
+        """
+        qn = self.connection.ops.quote_name
         style = no_style()
         sql_output = []
         db_table = model._meta.db_table
+        pk_column = self.get_pk_column(model)
         was_translatable_before = self.was_translatable_before(field_name, db_table_fields)
         default_f = self.get_default_field(field_name, model)
         default_f_required = default_f and self.get_field_required_in_db(db_table,
@@ -203,7 +783,7 @@ class Command(BaseCommand):
                 alter_colum_drop = 'ALTER COLUMN %s DROP' % qn(field_column)
             not_null = style.SQL_KEYWORD('NOT NULL')
 
-            if 'mysql' in backend.__name__:
+            if self.connection.vendor == 'mysql':
                 alter_colum_set = 'MODIFY %s %s' % (qn(field_column), col_type)
                 not_null = style.SQL_KEYWORD('NULL')
                 if default_f:
@@ -211,17 +791,16 @@ class Command(BaseCommand):
 
             # column creation
             if not new_field in db_table_fields:
-                sql_output.append("ALTER TABLE %s ADD COLUMN %s" % (qn(db_table), ' '.join(field_sql)))
+                sql_output.append((STAGE_ALTER, "ADD COLUMN %s" % ' '.join(field_sql)))
 
             if lang == self.default_lang and not was_translatable_before:
                 # data copy from old field (only for default language)
-                sql_output.append("UPDATE %s SET %s = %s" % (qn(db_table), \
-                                    qn(field_column), qn(field_name)))
+                sql_output.append((STAGE_UPDATE, Backfill(qn(db_table), "%s = %s" % \
+                                    (qn(field_column), qn(field_name)), pk_column=pk_column)))
                 if not f.null:
                     # changing to NOT NULL after having data copied
-                    sql_output.append("ALTER TABLE %s %s %s" % \
-                                    (qn(db_table), alter_colum_set, \
-                                    style.SQL_KEYWORD('NOT NULL')))
+                    sql_output.append((STAGE_ALTER_AFTER_UPDATE, "%s %s" % \
+                                    (alter_colum_set, style.SQL_KEYWORD('NOT NULL'))))
             elif default_f and not default_f.null:
                 if lang == self.default_lang:
                     f_required = self.get_field_required_in_db(db_table,
@@ -231,26 +810,27 @@ class Command(BaseCommand):
                         continue
                     if not f_required:
                         # data copy from old field (only for default language)
-                        sql_output.append(("UPDATE %(db_table)s SET %(f_colum)s = '%(value_default)s' "
-                                    "WHERE %(f_colum)s is %(null)s or %(f_colum)s = '' " %  
-                                        {'db_table': qn(db_table),
-                                        'f_colum': qn(field_column),
+                        sql_output.append((STAGE_UPDATE, Backfill(qn(db_table),
+                                    "%(f_colum)s = '%(value_default)s'" %
+                                        {'f_colum': qn(field_column),
                                         'value_default': self.get_value_default(),
+                                        },
+                                    where="%(f_colum)s is %(null)s or %(f_colum)s = ''" %
+                                        {'f_colum': qn(field_column),
                                         'null': style.SQL_KEYWORD('NULL'),
-                                        }))
+                                        },
+                                    pk_column=pk_column)))
                         # changing to NOT NULL after having data copied
-                        sql_output.append("ALTER TABLE %s %s %s" % \
-                                        (qn(db_table), alter_colum_set, \
-                                        style.SQL_KEYWORD('NOT NULL')))
+                        sql_output.append((STAGE_ALTER_AFTER_UPDATE, "%s %s" % \
+                                        (alter_colum_set, style.SQL_KEYWORD('NOT NULL'))))
                 else:
                     f_required = self.get_field_required_in_db(db_table,
                                                            field_column,
                                                            value_not_implemented=True)
                     if f_required:
-                        sql_output.append(("ALTER TABLE %s %s %s" % 
-                                        (qn(db_table), alter_colum_drop, not_null)))
+                        sql_output.append((STAGE_ALTER, "%s %s" % (alter_colum_drop, not_null)))
 
         if not was_translatable_before:
             # we drop field only if field was no translatable before
-            sql_output.append("ALTER TABLE %s DROP COLUMN %s" % (qn(db_table), qn(field_name)))
+            sql_output.append((STAGE_ALTER_AFTER_UPDATE, "DROP COLUMN %s" % qn(field_name)))
         return sql_output
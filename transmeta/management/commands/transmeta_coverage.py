@@ -0,0 +1,68 @@
+"""
+ Show the fill rate of every translatable field in each language, computed
+ in the database with one query per table.
+
+   $ ./manage.py transmeta_coverage --format=json --sample=5
+
+"""
+import json
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import get_models
+
+from transmeta import get_translation_info
+from transmeta.coverage import get_translation_coverage
+
+
+def format_rate(count, rows):
+    if not rows:
+        return '-'
+    return '%.1f%%' % (100.0 * count / rows)
+
+
+class Command(BaseCommand):
+    help = "Show the fill rate of the translatable fields in each language"
+
+    option_list = BaseCommand.option_list + (
+        make_option('-m', '--model', action='append', dest='models',
+                    help="Model to check, as app_label.model_name, it can be repeated (default: all)"),
+        make_option('--database', dest='database',
+                    help="Database to use (default: the one the router reads the model from)"),
+        make_option('--sample', dest='sample', type='float',
+                    help="Read only about this percentage of the rows of each table"),
+        make_option('--format', dest='format', default='text', choices=('text', 'json'),
+                    help="Format of the report: text or json (default: text)"),
+    )
+
+    def handle(self, *args, **options):
+        """ command execution """
+        sample = options.get('sample')
+        if sample is not None and not 0 < sample <= 100:
+            raise CommandError('The sample must be a percentage between 0 and 100')
+        labels = options.get('models')
+        reports = []
+        for model in get_models():
+            if model._meta.proxy or not get_translation_info(model).local_fields:
+                continue
+            if labels and '%s.%s' % (model._meta.app_label, model._meta.module_name) not in labels:
+                continue
+            try:
+                reports.append(get_translation_coverage(model, using=options.get('database'), sample=sample))
+            except ValueError as e:
+                raise CommandError(e)
+
+        if options.get('format') == 'json':
+            print (json.dumps(reports, indent=2, sort_keys=True))
+            return
+        for report in reports:
+            print ('"%s" (table %s, %d rows%s):' % (report['model'], report['table'], report['rows'],
+                                                  report['sample'] and ', %s%% sample' % report['sample'] or ''))
+            rows = report['rows']
+            for field in sorted(report['fields']):
+                for lang, coverage in sorted(report['fields'][field].items()):
+                    print ('   %s_%s: %s filled, %s fallback, %s missing' % (
+                        field, lang, format_rate(coverage['filled'], rows),
+                        format_rate(coverage['fallback'], rows), format_rate(coverage['missing'], rows)))
+            print ('')
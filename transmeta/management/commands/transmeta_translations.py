@@ -0,0 +1,366 @@
+"""
+ Export the translatable fields of all models to a file and import them back.
+
+   $ ./manage.py transmeta_translations export translations.csv
+   $ ./manage.py transmeta_translations import translations.csv
+
+ CSV files have a row per object and field, with a column per language:
+
+   model,pk,field,en,es
+   news.article,1,title,Hello,Hola
+
+ PO files have the translations of one language, with the values in the
+ mandatory language as msgid:
+
+   $ ./manage.py transmeta_translations export fr.po --language=fr
+
+ Empty values are not imported, and only the columns whose value changes
+ are updated, in batches of objects.
+
+"""
+import csv
+import io
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import get_model, get_models
+from django.utils import six
+
+from transmeta import (mandatory_language, get_real_fieldname, get_languages,
+                       get_translation_info, get_translations_fieldname)
+from transmeta.fields import decode_translations, encode_translations
+
+FORMAT_CSV = 'csv'
+FORMAT_PO = 'po'
+
+CSV_HEADER = ['model', 'pk', 'field']
+
+BATCH_SIZE = 1000
+
+
+def get_model_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.module_name)
+
+
+def get_pk_field(model):
+    """ returns the field with the type of the primary key, the one of the parent model for a parent link """
+    pk = model._meta.pk
+    while pk.rel is not None:
+        pk = pk.rel.get_related_field()
+    return pk
+
+
+def po_escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t')
+
+
+def po_unescape(value):
+    chars = []
+    escaped = False
+    for char in value:
+        if escaped:
+            chars.append({'n': '\n', 't': '\t'}.get(char, char))
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        else:
+            chars.append(char)
+    return ''.join(chars)
+
+
+def write_po_entry(stream, keyword, value):
+    lines = value.split('\n')
+    if len(lines) == 1:
+        stream.write(u'%s "%s"\n' % (keyword, po_escape(value)))
+        return
+    stream.write(u'%s ""\n' % keyword)
+    for i, line in enumerate(lines):
+        if i < len(lines) - 1:
+            line += '\n'
+        if line:
+            stream.write(u'"%s"\n' % po_escape(line))
+
+
+def read_po(stream):
+    """ yields (msgctxt, msgid, msgstr) for each not fuzzy entry of a PO file """
+    entry = {}
+    entry_fuzzy = False
+    keyword = None
+    fuzzy = False  # flag of the comments before the next entry
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            if line.startswith('#,') and 'fuzzy' in line:
+                fuzzy = True
+            continue
+        if line.startswith('"'):
+            entry[keyword] += po_unescape(line[1:-1])
+            continue
+        keyword, value = line.split(' ', 1)
+        if keyword == 'msgctxt' or (keyword == 'msgid' and ('msgid' in entry or 'msgctxt' not in entry)):
+            if 'msgstr' in entry and not entry_fuzzy:
+                yield entry.get('msgctxt'), entry['msgid'], entry['msgstr']
+            entry = {}
+            entry_fuzzy = fuzzy
+            fuzzy = False
+        entry[keyword] = po_unescape(value.strip()[1:-1])
+    if 'msgstr' in entry and not entry_fuzzy:
+        yield entry.get('msgctxt'), entry['msgid'], entry['msgstr']
+
+
+def open_csv(path, mode):
+    if six.PY3:
+        return open(path, mode, newline='', encoding='utf-8')
+    return open(path, mode + 'b')
+
+
+def encode_csv_row(row):
+    if six.PY3:
+        return row
+    return [value.encode('utf-8') for value in row]
+
+
+def decode_csv_row(row):
+    if six.PY3:
+        return row
+    return [value.decode('utf-8') for value in row]
+
+
+class Command(BaseCommand):
+    help = "Export the translatable fields of all models to CSV or PO files and import them back"
+    args = "export|import <file>"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', choices=(FORMAT_CSV, FORMAT_PO),
+                    help="Format of the file: csv or po (default: from the file extension)"),
+        make_option('-l', '--language', action='append', dest='languages',
+                    help="Language to export or import, it can be repeated "
+                         "(default: all, one is required with PO files)"),
+        make_option('--source-language', dest='source_language',
+                    help="Language of the msgid of PO files (default: the mandatory language)"),
+        make_option('-m', '--model', action='append', dest='models',
+                    help="Model to export, as app_label.model_name, it can be repeated (default: all)"),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+                    help="Database to use (default: default)"),
+        make_option('--batch-size', dest='batch_size', type='int', default=BATCH_SIZE,
+                    help="Objects read and updated in each transaction (default: %s)" % BATCH_SIZE),
+    )
+
+    def handle(self, *args, **options):
+        """ command execution """
+        if len(args) != 2 or args[0] not in ('export', 'import'):
+            raise CommandError('Usage: %s' % self.args)
+        action, path = args
+        self.db = options.get('database') or DEFAULT_DB_ALIAS
+        self.batch_size = options.get('batch_size') or BATCH_SIZE
+        self.format = options.get('format') or (path.endswith('.po') and FORMAT_PO or FORMAT_CSV)
+        available_languages = [lang_code for lang_code, lang_name in get_languages()]
+        self.languages = options.get('languages') or available_languages
+        for lang in self.languages:
+            if lang not in available_languages:
+                raise CommandError('Unknown language: %s' % lang)
+        if self.format == FORMAT_PO and len(self.languages) != 1:
+            raise CommandError('Choose the language of the PO file with --language')
+        self.source_language = options.get('source_language') or mandatory_language()
+
+        if action == 'export':
+            self.export_translations(path, self.get_translatable_models(options.get('models')))
+        else:
+            self.import_translations(path)
+
+    def get_translatable_models(self, labels=None):
+        """ returns the models with translatable fields in their table """
+        translatable_models = []
+        for model in get_models():
+            if model._meta.proxy or not get_translation_info(model).local_fields:
+                continue
+            if labels and get_model_label(model) not in labels:
+                continue
+            translatable_models.append(model)
+        return translatable_models
+
+    def get_rows(self, model, languages):
+        """ yields (pk, field, {lang: value}) for each object and translatable field of a model """
+        info = get_translation_info(model)
+        columns = []
+        for field in info.local_fields:
+            if field in info.json_fields:
+                columns.append(get_translations_fieldname(field))
+            else:
+                columns.extend([get_real_fieldname(field, lang) for lang in languages
+                                if get_real_fieldname(field, lang) in info.real_fieldnames[field]])
+        queryset = model._default_manager.using(self.db).order_by('pk')
+        for row in queryset.values_list('pk', *columns).iterator():
+            values = dict(zip(columns, row[1:]))
+            for field in info.local_fields:
+                if field in info.json_fields:
+                    translations = decode_translations(values[get_translations_fieldname(field)])
+                    yield row[0], field, dict([(lang, translations.get(lang)) for lang in languages])
+                else:
+                    yield row[0], field, dict([(lang, values.get(get_real_fieldname(field, lang)))
+                                               for lang in languages])
+
+    def export_translations(self, path, translatable_models):
+        count = 0
+        if self.format == FORMAT_PO:
+            lang = self.languages[0]
+            stream = io.open(path, 'w', encoding='utf-8')
+            stream.write(u'msgid ""\nmsgstr ""\n"Language: %s\\n"\n'
+                         u'"Content-Type: text/plain; charset=UTF-8\\n"\n' % lang)
+            for model in translatable_models:
+                for pk, field, values in self.get_rows(model, [self.source_language, lang]):
+                    if not values[self.source_language]:
+                        continue
+                    stream.write(u'\n')
+                    write_po_entry(stream, 'msgctxt', u'%s:%s:%s' % (get_model_label(model), pk, field))
+                    write_po_entry(stream, 'msgid', six.text_type(values[self.source_language]))
+                    write_po_entry(stream, 'msgstr', six.text_type(values[lang] or ''))
+                    count += 1
+        else:
+            stream = open_csv(path, 'w')
+            writer = csv.writer(stream)
+            writer.writerow(encode_csv_row(CSV_HEADER + self.languages))
+            for model in translatable_models:
+                for pk, field, values in self.get_rows(model, self.languages):
+                    writer.writerow(encode_csv_row(
+                        [get_model_label(model), six.text_type(pk), field] +
+                        [values[lang] is not None and six.text_type(values[lang]) or u''
+                         for lang in self.languages]))
+                    count += 1
+        stream.close()
+        print ('Exported %d translations to %s' % (count, path))
+
+    def read_translations(self, path):
+        """ yields (model label, pk, field, {lang: value}) for each entry of a file """
+        if self.format == FORMAT_PO:
+            lang = self.languages[0]
+            stream = io.open(path, encoding='utf-8')
+            for msgctxt, msgid, msgstr in read_po(stream):
+                if not msgctxt:
+                    continue
+                # the model label has no ":", but a character primary key may
+                model_label, rest = msgctxt.split(':', 1)
+                pk, field = rest.rsplit(':', 1)
+                yield model_label, pk, field, {lang: msgstr}
+        else:
+            stream = open_csv(path, 'r')
+            reader = csv.reader(stream)
+            header = decode_csv_row(next(reader))
+            if header[:len(CSV_HEADER)] != CSV_HEADER:
+                raise CommandError('%s is not a translations CSV file' % path)
+            languages = header[len(CSV_HEADER):]
+            for row in reader:
+                row = decode_csv_row(row)
+                yield row[0], row[1], row[2], dict([(lang, value) for lang, value
+                                                    in zip(languages, row[len(CSV_HEADER):])
+                                                    if lang in self.languages])
+        stream.close()
+
+    def import_translations(self, path):
+        self.updated_values = self.updated_objects = self.skipped = 0
+        pending = {}
+        for model_label, pk, field, values in self.read_translations(path):
+            model = get_model(*model_label.split('.'))
+            if model is None or field not in get_translation_info(model).local_fields:
+                self.skipped += 1
+                continue
+            entries = pending.setdefault(model, {})
+            entries.setdefault(get_pk_field(model).to_python(pk), {})[field] = values
+            if len(entries) >= self.batch_size:
+                self.update_translations(model, pending.pop(model))
+        for model, entries in pending.items():
+            self.update_translations(model, entries)
+        print ('Updated %d values of %d objects from %s (%d entries skipped)' %
+               (self.updated_values, self.updated_objects, path, self.skipped))
+
+    def update_translations(self, model, entries):
+        """ updates the columns that change of a batch of objects, in one transaction """
+        info = get_translation_info(model)
+        opts = model._meta
+        columns = []
+        for field in set([field for values in entries.values() for field in values]):
+            if field in info.json_fields:
+                columns.append(get_translations_fieldname(field))
+            else:
+                columns.extend(info.real_fieldnames[field])
+        queryset = model._default_manager.using(self.db).filter(pk__in=list(entries))
+        current = dict([(row[0], dict(zip(columns, row[1:])))
+                        for row in queryset.values_list('pk', *columns)])
+
+        changes = {}
+        for pk, fields in entries.items():
+            if pk not in current:
+                self.skipped += len(fields)
+                continue
+            changed = False
+            for field, values in fields.items():
+                values = dict([(lang, value) for lang, value in values.items() if value])
+                if field in info.json_fields:
+                    column = get_translations_fieldname(field)
+                    translations_field = opts.get_field(column)
+                    translations = translations_field.to_python_translations(
+                        decode_translations(current[pk][column]))
+                    values = translations_field.to_python_translations(values)
+                    changed_langs = [lang for lang, value in values.items() if translations.get(lang) != value]
+                    if changed_langs:
+                        translations.update(values)
+                        changes.setdefault(column, {})[pk] = encode_translations(translations)
+                        self.updated_values += len(changed_langs)
+                        changed = True
+                    continue
+                for lang, value in values.items():
+                    column = get_real_fieldname(field, lang)
+                    if column not in current[pk]:
+                        self.skipped += 1
+                        continue
+                    value = opts.get_field(column).to_python(value)
+                    if value != current[pk][column]:
+                        changes.setdefault(column, {})[pk] = value
+                        self.updated_values += 1
+                        changed = True
+            if changed:
+                self.updated_objects += 1
+        if not changes:
+            return
+
+        connection = connections[self.db]
+        cursor = connection.cursor()
+        # set manual transaction management
+        transaction.commit_unless_managed(using=self.db)
+        transaction.enter_transaction_management(using=self.db)
+        transaction.managed(True, using=self.db)
+        try:
+            for column, values in changes.items():
+                sql, params = self.get_update_sql(model, column, values, connection)
+                cursor.execute(sql, params)
+            transaction.commit(using=self.db)
+        finally:
+            if transaction.is_dirty(using=self.db):
+                transaction.rollback(using=self.db)
+            transaction.leave_transaction_management(using=self.db)
+
+    def get_update_sql(self, model, column, values, connection):
+        """ returns an UPDATE setting a column of many rows to a value per primary key """
+        qn = connection.ops.quote_name
+        opts = model._meta
+        pk = opts.pk
+        field = opts.get_field(column)
+        placeholder = '%s'
+        if connection.vendor == 'postgresql':
+            # parameters in CASE are text, without an implicit cast to other types
+            placeholder = 'CAST(%%s AS %s)' % field.db_type(connection=connection)
+        pks = list(values)
+        params = []
+        for pk_value in pks:
+            params.append(pk.get_db_prep_value(pk_value, connection=connection))
+            params.append(field.get_db_prep_save(values[pk_value], connection=connection))
+        params.extend([pk.get_db_prep_value(pk_value, connection=connection) for pk_value in pks])
+        sql = 'UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+            qn(opts.db_table), qn(field.column), qn(pk.column),
+            ' '.join(['WHEN %%s THEN %s' % placeholder] * len(pks)),
+            qn(pk.column), ', '.join(['%s'] * len(pks)))
+        return sql, params
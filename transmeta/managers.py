@@ -0,0 +1,325 @@
+"""
+ Managers and querysets for models with translatable fields.
+
+   class Book(models.Model):
+       __metaclass__ = TransMeta
+
+       description = models.TextField()
+
+       objects = TransManager()
+
+       class Meta:
+           translate = ('description', )
+
+ Lookups, ordering and values() on a translatable field name are resolved
+ in the database:
+
+   Book.objects.filter(description__icontains='foo').order_by('description')
+   Book.objects.values('description')
+
+ To export many rows without building model instances:
+
+   for row in Book.objects.values_translated('id', 'description', batch_size=1000):
+       ...
+
+"""
+import copy
+from operator import itemgetter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query import QuerySet
+try:
+    from django.db.models.constants import LOOKUP_SEP
+except ImportError:  # django < 1.5
+    from django.db.models.sql.constants import LOOKUP_SEP
+from django.utils import tree
+from django.utils.datastructures import SortedDict
+
+from transmeta import (get_all_translatable_fields, get_fallback_chain,
+                       get_translation_info, get_translations_fieldname, has_json_storage)
+from transmeta.fields import decode_translations
+
+TRANSLATED_SUFFIX = 'translated'
+
+
+def resolve_columns(indexes, last_is_loaded):
+    """ returns a function resolving a translated value from the columns of a row """
+    def resolve(row):
+        value = None
+        for index in indexes:
+            value = row[index]
+            if value:
+                return value
+        return value if last_is_loaded else None
+    return resolve
+
+
+def resolve_json(index, langs, last_is_loaded, translated_fields):
+    """
+    returns a function resolving a translated value from the JSON column of
+    a row, typed by the field of its language (see TranslationsField)
+    """
+    def resolve(row):
+        translations = decode_translations(row[index])
+        value = None
+        for lang in langs:
+            value = translations.get(lang)
+            if value:
+                return translated_fields[lang].to_python(value)
+        if value is None or not last_is_loaded:
+            return None
+        return translated_fields[langs[-1]].to_python(value)
+    return resolve
+
+
+class TransQuerySet(QuerySet):
+
+    def get_translated_fieldname(self, field, lang=None):
+        """
+        returns the field that stores a translatable field in a language (the
+        active one by default). i.e. returns "name_fr" for "name" and "fr-ca"
+        """
+        for attname in get_fallback_chain(field, lang):
+            try:
+                self.model._meta.get_field(attname)
+            except FieldDoesNotExist:
+                continue
+            return attname
+        raise FieldDoesNotExist('%s has no field for %s in the language %s' %
+                                (self.model.__name__, field, lang))
+
+    def get_translation_sql(self, field, lang=None):
+        """
+        returns SQL with the value of a translatable field in a language (the
+        active one by default), following the same fallbacks than the
+        translated property. i.e. COALESCE(NULLIF(name_fr, ''), name_en).
+        The joins to the tables of the parents of the model with the columns
+        are added to the query of the queryset
+        """
+        opts = self.model._meta
+        chain = get_fallback_chain(field, lang)
+        json_storage = has_json_storage(self.model, field)
+        if json_storage:
+            translations_column = self._get_column_sql(get_translations_fieldname(field))
+        expressions = []
+        for attname in chain:
+            if json_storage:
+                if not isinstance(getattr(self.model, attname, None), property):
+                    continue
+                column = self.get_json_value_sql(translations_column, attname[len(field) + 1:])
+                is_text = True
+            else:
+                try:
+                    f = opts.get_field(attname)
+                except FieldDoesNotExist:
+                    continue
+                column = self._get_column_sql(attname)
+                is_text = isinstance(f, (models.CharField, models.TextField))
+            if attname != chain[-1] and is_text:
+                # empty strings fall back too
+                column = "NULLIF(%s, '')" % column
+            expressions.append(column)
+        if not expressions:
+            return 'NULL'
+        if len(expressions) == 1:
+            return expressions[0]
+        return 'COALESCE(%s)' % ', '.join(expressions)
+
+    def _get_column_sql(self, attname):
+        """
+        returns the column of a field with the alias of its table, joining
+        the one of the parent model it is inherited from
+        """
+        qn = connections[self.db].ops.quote_name
+        query = self.query
+        # the fourth argument is dupe_multis in django < 1.6 and can_reuse after
+        joins = query.setup_joins([attname], self.model._meta, query.get_initial_alias(), None)[3]
+        return '%s.%s' % (qn(joins[-1]), qn(self.model._meta.get_field(attname).column))
+
+    def get_json_value_sql(self, column, lang):
+        """ returns SQL with the value of a language in a JSON storage column """
+        vendor = connections[self.db].vendor
+        if vendor == 'postgresql':
+            return "%s->>'%s'" % (column, lang)
+        elif vendor == 'mysql':
+            return """JSON_UNQUOTE(JSON_EXTRACT(%s, '$."%s"'))""" % (column, lang)
+        elif vendor == 'sqlite':
+            return """json_extract(%s, '$."%s"')""" % (column, lang)
+        raise ImproperlyConfigured('Translations with JSON storage are not supported with %s' % vendor)
+
+    def with_translations(self, *fields, **kwargs):
+        """
+        adds the value of the translatable fields in a language (the active
+        one by default) as "<field>_translated", i.e. to order by them
+        """
+        lang = kwargs.pop('lang', None)
+        queryset = self._clone()
+        select = SortedDict()
+        for field in fields:
+            select['%s_%s' % (field, TRANSLATED_SUFFIX)] = queryset.get_translation_sql(field, lang)
+        return queryset.extra(select=select)
+
+    def _translate_lookup(self, lookup):
+        parts = lookup.split(LOOKUP_SEP)
+        info = get_translation_info(self.model)
+        if parts[0] in info.fields and parts[0] not in info.json_fields:
+            parts[0] = self.get_translated_fieldname(parts[0])
+        return LOOKUP_SEP.join(parts)
+
+    def _translate_q(self, node):
+        if not isinstance(node, tree.Node):
+            return node
+        translated = copy.copy(node)
+        translated.children = [(self._translate_lookup(child[0]), child[1])
+                               if isinstance(child, tuple) else self._translate_q(child)
+                               for child in node.children]
+        return translated
+
+    def _filter_or_exclude(self, negate, *args, **kwargs):
+        args = [self._translate_q(arg) for arg in args]
+        kwargs = dict([(self._translate_lookup(lookup), value)
+                       for lookup, value in kwargs.items()])
+        return super(TransQuerySet, self)._filter_or_exclude(negate, *args, **kwargs)
+
+    def order_by(self, *field_names):
+        translated_names = []
+        for field_name in field_names:
+            if field_name.startswith('-'):
+                field_name = '-' + self._translate_lookup(field_name[1:])
+            elif field_name != '?':
+                field_name = self._translate_lookup(field_name)
+            translated_names.append(field_name)
+        return super(TransQuerySet, self).order_by(*translated_names)
+
+    def _select_translations(self, fields):
+        translatable_fields = get_all_translatable_fields(self.model)
+        if not [field for field in fields if field in translatable_fields]:
+            return self
+        queryset = self._clone()
+        select = SortedDict()
+        for field in fields:
+            if field in translatable_fields:
+                select[field] = queryset.get_translation_sql(field)
+        return queryset.extra(select=select)
+
+    def values(self, *fields):
+        queryset = self._select_translations(fields)
+        return super(TransQuerySet, queryset).values(*fields)
+
+    def values_list(self, *fields, **kwargs):
+        queryset = self._select_translations(fields)
+        return super(TransQuerySet, queryset).values_list(*fields, **kwargs)
+
+    def values_translated(self, *fields, **kwargs):
+        """
+        yields a dict (or a tuple, with tuples=True) for each row, like
+        values(), with translatable fields resolved in a language (the
+        active one by default) with the fallbacks of the translated property.
+        No model instance is built. Rows are read with iterator() or, with
+        batch_size, in batches ordered by primary key.
+        """
+        lang = kwargs.pop('lang', None)
+        tuples = kwargs.pop('tuples', False)
+        batch_size = kwargs.pop('batch_size', None)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments to values_translated: %s' % list(kwargs))
+        opts = self.model._meta
+        translatable_fields = get_all_translatable_fields(self.model)
+        if not fields:
+            fields = [f.attname for f in opts.fields if not hasattr(f, 'original_fieldname')]
+            fields.extend(translatable_fields)
+
+        columns = []
+
+        def column_index(column):
+            if column not in columns:
+                columns.append(column)
+            return columns.index(column)
+
+        real_fields = [f.name for f in opts.fields]
+        resolvers = []
+        for field in fields:
+            if field not in translatable_fields:
+                resolvers.append(itemgetter(column_index(field)))
+                continue
+            chain = get_fallback_chain(field, lang)
+            if has_json_storage(self.model, field):
+                langs = [attname[len(field) + 1:] for attname in chain
+                         if isinstance(getattr(self.model, attname, None), property)]
+                translations_field = opts.get_field(get_translations_fieldname(field))
+                resolvers.append(resolve_json(column_index(translations_field.name), langs,
+                                              isinstance(getattr(self.model, chain[-1], None), property),
+                                              translations_field.translated_fields))
+            else:
+                resolvers.append(resolve_columns([column_index(attname) for attname in chain
+                                                  if attname in real_fields],
+                                                 chain[-1] in real_fields))
+
+        if batch_size:
+            pk_index = column_index('pk')
+            rows = self._batches(columns, pk_index, batch_size)
+        else:
+            rows = QuerySet.values_list(self, *columns).iterator()
+        for row in rows:
+            values = [resolve(row) for resolve in resolvers]
+            if tuples:
+                yield tuple(values)
+            else:
+                yield dict(zip(fields, values))
+
+    def _batches(self, columns, pk_index, batch_size):
+        """ yields the rows of values_list(*columns) in batches, ordered by primary key """
+        queryset = QuerySet.values_list(self, *columns).order_by('pk')
+        batch = queryset
+        while True:
+            rows = list(batch[:batch_size])
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            batch = queryset.filter(pk__gt=rows[-1][pk_index])
+
+    def defer_translations(self, lang=None):
+        """
+        defers every translated column but the ones read by the translated
+        properties in a language (the active one by default). Deferred
+        columns are loaded from the database when they are accessed.
+        """
+        info = get_translation_info(self.model)
+        deferred = []
+        for field in info.fields:
+            if field in info.json_fields:
+                continue
+            chain = get_fallback_chain(field, lang)
+            deferred.extend([real_field for real_field in info.real_fieldnames[field]
+                             if real_field not in chain])
+        return self.defer(*deferred)
+
+
+class TransManager(models.Manager):
+    """
+    Manager returning TransQuerySet instances. With defer_translations=True
+    only the columns of the active language fallbacks are loaded by default.
+    """
+
+    def __init__(self, defer_translations=False):
+        super(TransManager, self).__init__()
+        self.defer_active_translations = defer_translations
+
+    def get_queryset(self):
+        queryset = TransQuerySet(self.model, using=self._db)
+        if self.defer_active_translations:
+            queryset = queryset.defer_translations()
+        return queryset
+    get_query_set = get_queryset  # django < 1.6
+
+    def defer_translations(self, lang=None):
+        return self.get_queryset().defer_translations(lang)
+
+    def with_translations(self, *fields, **kwargs):
+        return self.get_queryset().with_translations(*fields, **kwargs)
+
+    def values_translated(self, *fields, **kwargs):
+        return self.get_queryset().values_translated(*fields, **kwargs)